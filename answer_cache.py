@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Semantic cache for LLM fallback answers. Each Ollama answer is stored with
+# the embedding of the message that produced it; a later message whose
+# embedding is close enough (cosine >= threshold) gets the stored answer
+# instead of another generation. Bounded by size (LRU) and age (TTL).
+#
+# scope="global" any user's answer can be served to anyone.
+# scope="user"   answers are only served back to the user who asked.
+
+THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.9"))
+MAX_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "5000"))
+TTL = float(os.environ.get("ANSWER_CACHE_TTL", "86400"))
+SCOPE = os.environ.get("ANSWER_CACHE_SCOPE", "global")
+
+_GLOBAL = -1
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold=THRESHOLD, maxsize=MAX_SIZE, ttl=TTL, scope=SCOPE):
+        if scope not in ("global", "user"):
+            raise ValueError(f"Unknown answer cache scope '{scope}'")
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.scope = scope
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Fixed slots: row i of _vectors belongs to _answers[i]. _lru orders
+        # the used slots from least to most recently used.
+        self._vectors = None
+        self._owners = np.full(maxsize, _GLOBAL - 1, dtype=np.int64)
+        self._expires = np.zeros(maxsize)
+        self._answers = [None] * maxsize
+        self._lru = OrderedDict()
+        self._free = list(range(maxsize - 1, -1, -1))
+        # scope="user": uid -> owner number, and owner -> [uid, slots held].
+        # A uid is dropped with its last slot, so memory stays bounded too.
+        self._owner_ids = {}
+        self._owned = {}
+        self._next_owner = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def _owner(self, uid, create=False):
+        if self.scope == "global":
+            return _GLOBAL
+        owner = self._owner_ids.get(uid)
+        if owner is None and create:
+            owner = self._owner_ids[uid] = self._next_owner
+            self._owned[owner] = [uid, 0]
+            self._next_owner += 1
+        return owner
+
+    def _release(self, slot):
+        owner = int(self._owners[slot])
+        owned = self._owned.get(owner)
+        if owned is not None:
+            owned[1] -= 1
+            if not owned[1]:
+                del self._owned[owner]
+                del self._owner_ids[owned[0]]
+        del self._lru[slot]
+        self._answers[slot] = None
+        self._owners[slot] = _GLOBAL - 1
+        self._free.append(slot)
+
+    def lookup(self, vec, uid=None):
+        with self._lock:
+            owner = self._owner(uid)
+            if self._vectors is None or owner is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            for slot in np.flatnonzero((self._owners != _GLOBAL - 1) & (self._expires <= now)):
+                self._release(int(slot))
+            scores = self._vectors @ np.asarray(vec, dtype=np.float32)
+            scores[self._owners != owner] = -np.inf
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return self._answers[slot]
+
+    def store(self, vec, answer, uid=None):
+        vec = np.asarray(vec, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, len(vec)), dtype=np.float32)
+            if not self._free:
+                oldest = next(iter(self._lru))
+                self._release(oldest)
+                self.evictions += 1
+            slot = self._free.pop()
+            self._vectors[slot] = vec
+            owner = self._owner(uid, create=True)
+            self._owners[slot] = owner
+            if owner in self._owned:
+                self._owned[owner][1] += 1
+            self._expires[slot] = time.time() + self.ttl
+            self._answers[slot] = answer
+            self._lru[slot] = True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "scope": self.scope,
+            "size": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
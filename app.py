@@ -1,177 +1,306 @@
-from neo4j import GraphDatabase
 from flask import Flask, request, jsonify
-from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import (
     MessageEvent, TextMessage, TextSendMessage,
     PostbackTemplateAction
 )
-from sentence_transformers import SentenceTransformer, util
-import numpy as np
-import requests
-import json
+import os
 
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
-headers = {
-    "Content-Type": "application/json"
-}
+import db
+from schema import ensure_schema
+from startup import Warmup
+from embedding_service import embedding_model
+from embedding_cache import encode_cached, encode_many_cached
+from dispatcher import EventDispatcher
+from greeting_index import GreetingIndex
+from embedding_store import EmbeddingStore
+from intents import IntentRegistry
+from webhook_worker import EventWorker
+from ollama_client import ollama
+from answer_cache import SemanticAnswerCache
+from write_behind import journal, timestamp
+from profile_cache import ProfileCache
+from thai_text import PreRouter
+from line_client import TimedLineBotApi, ReplyCollector, WebhookReader
+import metrics
 
-model = SentenceTransformer('sentence-transformers/distiluse-base-multilingual-cased-v2')
+MODEL_NAME = 'sentence-transformers/distiluse-base-multilingual-cased-v2'
+# Micro-batched; the shared service when EMBEDDING_SOCKET is set, otherwise
+# loaded in-process by the warm-up below
+model = embedding_model(MODEL_NAME)
 
 URI = "neo4j://localhost:7999"
 AUTH = ("neo4j", "password")
 
-def run_query(query, parameters=None):
-    with GraphDatabase.driver(URI, auth=AUTH) as driver:
-        driver.verify_connectivity()
-        with driver.session() as session:
-            result = session.run(query, parameters)
-            return [record for record in result]
+# Set ASYNC_WEBHOOK=1 to answer LINE at once and process events in the background
+ASYNC_WEBHOOK = os.environ.get("ASYNC_WEBHOOK") == "1"
+
+db.configure(URI, AUTH)
+
+# Greeting vectors are kept on disk and only new names are encoded
+greeting_index = GreetingIndex(model, store=EmbeddingStore("greeting", MODEL_NAME, model))
+intent_registry = IntentRegistry(model)
+
+# Per user: the prompt carries the asker's name, so an answer may too
+answer_cache = metrics.watch_cache("answer", SemanticAnswerCache(scope="user"))
+
+# Keyword rules checked before any embedding: "เชื่อ" is its own keyword so
+# it never counts as "ชื่อ", and a message containing it is never set_name
+pre_router = PreRouter(
+    keywords={"ชื่อ": "name", "อะไร": "what", "เชื่อ": "believe"},
+    rules=[("ask_name", {"name", "what"}), ("set_name", {"name"}, {"believe"})],
+)
 
 def save_user_info(uid, name):
     query = '''
     MERGE (u:User {uid: $uid})
     SET u.name = $name
     '''
-    run_query(query, parameters={'uid': uid, 'name': name})
+    db.write_query(query, parameters={'uid': uid, 'name': name})
+    profile_cache.put(uid, name)
 
-def get_user_name(uid):
+def load_user_names(uids):
     query = '''
-    MATCH (u:User {uid: $uid})
-    RETURN u.name AS name
+    UNWIND $uids AS uid
+    MATCH (u:User {uid: uid})
+    RETURN u.uid AS uid, u.name AS name
     '''
-    result = run_query(query, parameters={'uid': uid})
-    return result[0]['name'] if result else None
+    result = db.read_query(query, parameters={'uids': list(set(uids))})
+    return {record['uid']: record['name'] for record in result}
+
+# Names rarely change, so they are read through a cache
+profile_cache = ProfileCache(load_user_names)
+
+def get_user_name(uid):
+    return profile_cache.get(uid)
+
+def get_user_names(uids):
+    return profile_cache.get_many(uids)
+
+def save_user_uid(uid):
+    journal.submit("user", {'uid': uid})
+    profile_cache.add(uid)
 
 def log_chat_history(uid, message, reply):
-    query = '''
-    MATCH (u:User {uid: $uid})
-    CREATE (c:Chat {message: $message, reply: $reply, timestamp: timestamp()})
-    CREATE (u)-[:SENT]->(c)
-    '''
-    run_query(query, parameters={'uid': uid, 'message': message, 'reply': reply})
+    # Queued; written in a batch by the write-behind journal
+    journal.submit("chat", {'uid': uid, 'message': message, 'reply': reply, 'timestamp': timestamp()})
 
 def save_response(uid, answer_text, response_msg):
     # Cypher query to match User and create Answer and Response nodes with relationships
-    query = '''
-    MATCH (u:User {uid: $uid})
-    CREATE (a:Answer {text: $answer_text})
-    CREATE (r:Response {text: $response_msg})
-    CREATE (u)-[:useranswer]->(a)
-    CREATE (a)-[:response]->(r)
-    '''
-    parameters = {
-        'uid': uid,
-        'answer_text': answer_text,
-        'response_msg': response_msg
-    }
-    run_query(query, parameters)
+    journal.submit("response", {'uid': uid, 'answer_text': answer_text, 'response_msg': response_msg})
 
 def compute_response(sentence):
-    greeting_corpus = list(set(record['name'] for record in run_query('MATCH (n:Greeting) RETURN n.name as name;')))
-    greeting_vec = model.encode(greeting_corpus, convert_to_tensor=True, normalize_embeddings=True)
-    ask_vec = model.encode(sentence, convert_to_tensor=True, normalize_embeddings=True)
-    greeting_scores = util.cos_sim(greeting_vec, ask_vec)
-    
-    max_greeting_score_index = np.argmax(greeting_scores.cpu().numpy())
-    if greeting_scores[max_greeting_score_index] > 0.8:
-        match_greeting = greeting_corpus[max_greeting_score_index]
-        my_cypher = f"MATCH (n:Greeting) WHERE n.name = '{match_greeting}' RETURN n.msg_reply AS reply"
-        results = run_query(my_cypher)
-        return results[0]['reply'] if results else None
-    return None
+    ask_vec = encode_cached(model, MODEL_NAME, sentence)
+    with metrics.span("greeting_match"):
+        return greeting_index.match(ask_vec, threshold=0.8)
 
 def check_previous_question(question):
     cypher_query = '''
     MATCH (q:Question {text: $question})-[:HAS_ANSWER]->(a:Answer)
     RETURN a.text AS answer
     '''
-    result = run_query(cypher_query, parameters={"question": question})
+    result = db.read_query(cypher_query, parameters={"question": question})
     return result[0]['answer'] if result else None
 
-def is_similar_query(user_query, expected_queries):
-    user_vec = model.encode(user_query, convert_to_tensor=True, normalize_embeddings=True)
-    for expected in expected_queries:
-        expected_vec = model.encode(expected, convert_to_tensor=True, normalize_embeddings=True)
-        score = util.cos_sim(user_vec, expected_vec)
-        if score > 0.7:  # Adjust threshold as needed
-            return True
-    return False
+def check_previous_questions(questions):
+    cypher_query = '''
+    UNWIND $questions AS question
+    MATCH (q:Question {text: question})-[:HAS_ANSWER]->(a:Answer)
+    RETURN question, a.text AS answer
+    '''
+    result = db.read_query(cypher_query, parameters={"questions": list(set(questions))})
+    answers = {}
+    for record in result:
+        answers.setdefault(record['question'], record['answer'])
+    return answers
 
-def remove_endings(text):
-    endings = ["ครับ", "ค่ะ", "น้ะ", "นะ", "นะจ้ะ"]
-    for ending in endings:
-        text = text.replace(ending, "")
-    return text.strip()
+def is_similar_query(user_query, intent, threshold=0.7):
+    user_vec = encode_cached(model, MODEL_NAME, user_query)
+    return intent_registry.scores(user_vec).get(intent, 0.0) > threshold  # Adjust threshold as needed
 
 app = Flask(__name__)
 
-with open('/Users/sittasahathum/Desktop/social/venv/username_line.txt', 'r') as file:
+# Token on the first line, channel secret on the second
+LINE_CREDENTIALS = os.environ.get("LINE_CREDENTIALS_FILE", '/Users/sittasahathum/Desktop/social/venv/username_line.txt')
+with open(LINE_CREDENTIALS, 'r') as file:
     lines = file.readlines()
     channel_access_token = lines[0].strip()  
     channel_secret = lines[1].strip()          
 
-@app.route("/", methods=['POST'])
-def linebot():
-    body = request.get_data(as_text=True)
-    try:
-        json_data = json.loads(body)
-        line_bot_api = LineBotApi(channel_access_token)
-        handler = WebhookHandler(channel_secret)
-        signature = request.headers['X-Line-Signature']
-        handler.handle(body, signature)
-
-        msg = json_data['events'][0]['message']['text']
-        tk = json_data['events'][0]['replyToken']
-        uid = json_data['events'][0]['source']['userId']
-
-        # Remove ending phrases
-        msg = remove_endings(msg)
-        
-        # Check for name input
-        if "ชื่อ" in msg and "อะไร" in msg:
-            user_name = get_user_name(uid)
-            if user_name:
-                line_bot_api.reply_message(tk, TextSendMessage(text=f"ชื่อของคุณคือ {user_name} ค่ะ"))
-            else:
-                line_bot_api.reply_message(tk, TextSendMessage(text="ขอโทษค่ะ ฉันไม่ทราบชื่อของคุณ"))
+# Built once: the client keeps its connections to the LINE API open
+line_bot_api = TimedLineBotApi(channel_access_token)
+webhook_reader = WebhookReader(channel_secret)
 
-        elif "ชื่อ" in msg and "เชื่อ" not in msg:
-            name = msg.split("ชื่อ")[-1].strip()
-            if name:
-                save_user_info(uid, name)
-                line_bot_api.reply_message(tk, TextSendMessage(text=f"ขอบคุณที่แนะนำตัวค่ะ {name}"))
-            else:
-                line_bot_api.reply_message(tk, TextSendMessage(text="ไม่สามารถระบุชื่อได้ กรุณาระบุชื่อของคุณค่ะ"))
+dispatcher = EventDispatcher()
+
+@dispatcher.on("follow")
+def handle_follow(event):
+    save_user_uid(event['source']['userId'])
+
+@dispatcher.on_text
+def handle_text_events(events):
+    # Everything said to one event goes out in a single reply call, as
+    # soon as that event is done
+    with ReplyCollector(line_bot_api) as replies:
+        answer_text_events(replies, events)
 
-        # Respond to name inquiries
-        user_name = get_user_name(uid)
-        if user_name and is_similar_query(msg, ["ชื่ออะไร", "ผมชื่ออะไร", "ชื่อของฉัน"]):
+def answer_text_events(replies, events):
+    # Particles removed and keywords tagged in one pass
+    with metrics.span("pre_route"):
+        routes = [pre_router.route(event['message']['text']) for event in events]
+    uids = [event['source'].get('userId') for event in events]
+    with metrics.span("prefetch"):
+        user_names = get_user_names(uids)
+
+    # Rule matches and exact greetings are answered without the model
+    pending = []
+    for event, route, uid in zip(events, routes, uids):
+        tk = event['replyToken']
+        answered = True
+        try:
+            answered = (handle_rule_message(replies, tk, uid, route, user_names)
+                        or handle_greeting_exact(replies, tk, uid, route.text))
+        except Exception as e:
+            print("Error:", e)
+            print(event)
+        if answered:
+            replies.flush(tk)  # Sent now, not after the slowest event
+        else:
+            pending.append((event, route.text, uid))
+    if not pending:
+        return
+
+    # One encode call and one query per lookup for the rest of the batch
+    msgs = [msg for event, msg, uid in pending]
+    with metrics.span("encode"):
+        encode_many_cached(model, MODEL_NAME, msgs)
+    with metrics.span("prefetch"):
+        previous_answers = check_previous_questions(msgs)
+
+    for event, msg, uid in pending:
+        try:
+            handle_text_message(replies, event['replyToken'], uid, msg, user_names, previous_answers)
+        except Exception as e:
+            print("Error:", e)
+            print(event)
+        finally:
+            replies.flush(event['replyToken'])
+
+def handle_rule_message(line_bot_api, tk, uid, route, user_names):
+    # Returns True when the message was answered here
+    if route.intent == "ask_name":
+        metrics.count_path("ask_name")
+        user_name = user_names.get(uid)
+        if user_name:
             line_bot_api.reply_message(tk, TextSendMessage(text=f"ชื่อของคุณคือ {user_name} ค่ะ"))
+        else:
+            line_bot_api.reply_message(tk, TextSendMessage(text="ขอโทษค่ะ ฉันไม่ทราบชื่อของคุณ"))
+        return True
 
-        response_msg = compute_response(msg)
+    if route.intent == "set_name":
+        metrics.count_path("set_name")
+        name = route.after("name")
+        if name:
+            save_user_info(uid, name)
+            user_names[uid] = name
+            line_bot_api.reply_message(tk, TextSendMessage(text=f"ขอบคุณที่แนะนำตัวค่ะ {name}"))
+        else:
+            line_bot_api.reply_message(tk, TextSendMessage(text="ไม่สามารถระบุชื่อได้ กรุณาระบุชื่อของคุณค่ะ"))
+        return True
+    return False
+
+def handle_greeting_exact(line_bot_api, tk, uid, msg):
+    # A message that is exactly a greeting name needs no embedding
+    response_msg = greeting_index.exact(msg)
+    if response_msg is None:
+        return False
+    metrics.count_path("greeting_exact")
+    line_bot_api.reply_message(tk, TextSendMessage(text=response_msg + " ค่ะ"))
+    log_chat_history(uid, msg, response_msg)
+    return True
+
+def handle_text_message(line_bot_api, tk, uid, msg, user_names, previous_answers):
+    # Respond to name inquiries
+    user_name = user_names.get(uid)
+    if user_name and is_similar_query(msg, "ask_name"):
+        line_bot_api.reply_message(tk, TextSendMessage(text=f"ชื่อของคุณคือ {user_name} ค่ะ"))
 
-        if response_msg:
-            line_bot_api.reply_message(tk, TextSendMessage(text=response_msg + " ค่ะ"))
-            log_chat_history(uid, msg, response_msg)  # Log the chat history
+    response_msg = compute_response(msg)
+
+    if response_msg:
+        metrics.count_path("greeting")
+        line_bot_api.reply_message(tk, TextSendMessage(text=response_msg + " ค่ะ"))
+        log_chat_history(uid, msg, response_msg)  # Log the chat history
+    else:
+        previous_answer = previous_answers.get(msg)
+        if previous_answer:
+            metrics.count_path("previous_question")
+            line_bot_api.reply_message(tk, TextSendMessage(text=previous_answer + " ค่ะ"))
         else:
-            previous_answer = check_previous_question(msg)
-            if previous_answer:
-                line_bot_api.reply_message(tk, TextSendMessage(text=previous_answer + " ค่ะ"))
+            # Paraphrases of questions Ollama already answered are served from the cache
+            msg_vec = encode_cached(model, MODEL_NAME, msg)
+            cached_answer = answer_cache.lookup(msg_vec, uid)
+            if cached_answer:
+                metrics.count_path("answer_cache")
+                line_bot_api.reply_message(tk, TextSendMessage(text=cached_answer + " ค่ะ\n.....คำตอบจาก Ollama..."))
+                return
+            metrics.count_path("llm_fallback")
+            prompt = f"ผู้ถามชื่อ คุณ{user_name} ตอบสั้นๆไม่เกิน 20 คำ เกี่ยวกับ '{msg}'"
+            generation = ollama.generate(prompt, model="supachai/llama-3-typhoon-v1.5")
+            if generation.ok:
+                decoded_text = generation.text
+                line_bot_api.reply_message(tk, TextSendMessage(text=decoded_text + " ค่ะ\n.....คำตอบจาก Ollama..."))
+                answer_cache.store(msg_vec, decoded_text, uid)
+                save_response(uid, msg, decoded_text)  # Save the answer and response
             else:
-                payload = {
-                    "model": "supachai/llama-3-typhoon-v1.5",
-                    "prompt": f"ผู้ถามชื่อ คุณ{user_name} ตอบสั้นๆไม่เกิน 20 คำ เกี่ยวกับ '{msg}'",
-                    "stream": False
-                }
-                response = requests.post(OLLAMA_API_URL, headers=headers, data=json.dumps(payload))
-                if response.status_code == 200:
-                    decoded_text = response.json().get("response", "")
-                    line_bot_api.reply_message(tk, TextSendMessage(text=decoded_text + " ค่ะ\n.....คำตอบจาก Ollama..."))
-                    save_response(uid, msg, decoded_text)  # Save the answer and response
-                else:
-                    print(f"Failed to get a response from Ollama: {response.status_code}, {response.text}")
-                    line_bot_api.reply_message(tk, TextSendMessage(text="เกิดข้อผิดพลาดในการติดต่อ LLaMA"))
+                print(f"Failed to get a response from Ollama: {generation.status_code}, {generation.error}")
+                line_bot_api.reply_message(tk, TextSendMessage(text="เกิดข้อผิดพลาดในการติดต่อ LLaMA"))
+
+# Start-up work, run in the background; /readyz turns 200 once it is done
+warmup = Warmup()
+
+@warmup.step
+def load_model():
+    # One dummy encode so the first user does not pay for lazy allocations
+    model.encode(["warm-up"], normalize_embeddings=True)
+
+@warmup.step
+def connect_db():
+    db.verify_connectivity()
+    ensure_schema()
+
+@warmup.step
+def build_indexes():
+    greeting_index.refresh(force=True)
+    intent_registry.register("ask_name", ["ชื่ออะไร", "ผมชื่ออะไร", "ชื่อของฉัน"])
+
+warmup.register_routes(app)
+metrics.register_routes(app)
+warmup.start()
+
+def handle_events(json_data):
+    with metrics.trace("webhook"):
+        dispatcher.dispatch(json_data)
+
+event_worker = EventWorker(handle_events)
+if ASYNC_WEBHOOK:
+    event_worker.start()
+
+@app.route("/", methods=['POST'])
+def linebot():
+    if not warmup.ready:
+        return 'Starting', 503
+
+    body = request.get_data(as_text=True)
+    try:
+        # Signature check and JSON decode in one pass
+        json_data = webhook_reader.parse(body, request.headers['X-Line-Signature'])
+
+        if not ASYNC_WEBHOOK:
+            handle_events(json_data)
+        elif not event_worker.submit(json_data):
+            # Queue is full: refuse so LINE retries later instead of piling up work
+            return 'Busy', 503
 
     except InvalidSignatureError:
         print("Invalid signature.")
@@ -180,5 +309,9 @@ def linebot():
         print(body)
     return 'OK'
 
+@app.route("/queue", methods=['GET'])
+def queue_stats():
+    return jsonify(event_worker.stats())
+
 if __name__ == '__main__':
     app.run(port=5000)
@@ -0,0 +1,140 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Compares the embedding backends from embedding_backend.py on CPU: load
+# time, resident memory, single-sentence encode latency, batch throughput,
+# and top-1 match accuracy on the greeting / Barista match sets, both against
+# the labels and as agreement with the fp32 SentenceTransformer.
+#
+#   python benchmarks/bench_embedding_backends.py [--model NAME] [--variants torch-fp32,onnx-fp32,onnx-int8]
+#
+# Each variant runs in a fresh process so its memory is measured alone.
+# The default model is the one app.py / miniproject2.py use; pass
+# --model sentence-transformers/xlm-r-bert-base-nli-stsb-mean-tokens for
+# knowlege.py.
+
+DEFAULT_MODEL = 'sentence-transformers/distiluse-base-multilingual-cased-v2'
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "match_corpus.json")
+
+VARIANTS = {
+    "torch-fp32": ("torch", False),
+    "onnx-fp32": ("onnx", False),
+    "onnx-int8": ("onnx", True),
+}
+REFERENCE = "torch-fp32"
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_variant(model_name, backend, quantize, match_sets, rounds, batch_size):
+    from embedding_backend import load_model
+
+    before = rss_mb()
+    started = time.perf_counter()
+    model = load_model(model_name, backend=backend, quantize=quantize)
+    model.encode(["warm-up"], normalize_embeddings=True)
+    load_time = time.perf_counter() - started
+    loaded = rss_mb()
+
+    queries = [query for match_set in match_sets.values() for query, _ in match_set["queries"]]
+    latencies = []
+    for _ in range(rounds):
+        for query in queries:
+            started = time.perf_counter()
+            model.encode(query, normalize_embeddings=True)
+            latencies.append(time.perf_counter() - started)
+
+    texts = [text for match_set in match_sets.values() for text in match_set["corpus"]] + queries
+    texts = texts * max(1, 512 // len(texts))
+    started = time.perf_counter()
+    model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    throughput = len(texts) / (time.perf_counter() - started)
+
+    vectors = {}
+    for name, match_set in match_sets.items():
+        corpus = np.asarray(model.encode(match_set["corpus"], normalize_embeddings=True), dtype=np.float32)
+        query_vecs = np.asarray(model.encode([query for query, _ in match_set["queries"]], normalize_embeddings=True), dtype=np.float32)
+        vectors[name] = (corpus, query_vecs)
+
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "load_s": load_time,
+        "rss_mb": loaded - before,
+        "peak_rss_mb": rss_mb() - before,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "throughput": throughput,
+        "vectors": vectors,
+    }
+
+
+def top1(corpus, queries):
+    return np.argmax(queries @ corpus.T, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends on CPU")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        match_sets = json.load(f)
+    names = [name.strip() for name in args.variants.split(",") if name.strip()]
+    if REFERENCE not in names:
+        names.insert(0, REFERENCE)
+
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for name in names:
+        backend, quantize = VARIANTS[name]
+        print(f"running {name} ...", flush=True)
+        with ctx.Pool(1) as pool:
+            results[name] = pool.apply(run_variant, (args.model, backend, quantize, match_sets, args.rounds, args.batch_size))
+
+    reference = results[REFERENCE]["vectors"]
+    print(f"\nmodel: {args.model}")
+    print(f"{'variant':<12} {'load s':>7} {'RSS MB':>7} {'peak MB':>8} {'p50 ms':>7} {'p95 ms':>7} {'sent/s':>8}")
+    for name in names:
+        r = results[name]
+        print(f"{name:<12} {r['load_s']:7.1f} {r['rss_mb']:7.0f} {r['peak_rss_mb']:8.0f} {r['p50_ms']:7.2f} {r['p95_ms']:7.2f} {r['throughput']:8.1f}")
+
+    print(f"\n{'variant':<12} {'set':<9} {'top-1 acc':>9} {'vs fp32':>9} {'agree':>7} {'cos fp32':>9}")
+    for name in names:
+        for set_name, match_set in match_sets.items():
+            corpus, queries = results[name]["vectors"][set_name]
+            ref_corpus, ref_queries = reference[set_name]
+            expected = np.asarray([match_set["corpus"].index(label) for _, label in match_set["queries"]])
+            predicted = top1(corpus, queries)
+            ref_predicted = top1(ref_corpus, ref_queries)
+            accuracy = float(np.mean(predicted == expected))
+            ref_accuracy = float(np.mean(ref_predicted == expected))
+            agreement = float(np.mean(predicted == ref_predicted))
+            cosine = float(np.mean(np.sum(queries * ref_queries, axis=1)))
+            print(f"{name:<12} {set_name:<9} {accuracy:9.1%} {accuracy - ref_accuracy:+9.1%} {agreement:7.1%} {cosine:9.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from answer_cache import SemanticAnswerCache
+from dispatcher import EventDispatcher
+from embedding_cache import embedding_cache
+from thai_text import remove_endings
+
+from fakes import FakeEncoder, FakeGraph, FakeLineApi, FakeOllama, sign, webhook_body
+from serve_bot import import_bot, prepare_environment
+
+# Offline microbenchmarks for the per-message hot path at several corpus
+# sizes. The bots are imported the way serve_bot.py does it, with Neo4j
+# answered by the FakeGraph from fakes.py, Ollama and LINE replaced by
+# FakeOllama / FakeLineApi and warm-up left to the benchmark, so every case
+# calls the bots' own functions. The encoder is either FakeEncoder
+# (deterministic, no model, the default) or a real SentenceTransformer via
+# embedding_backend; it is handed to the bots directly, so the
+# micro-batcher's queueing delay is not included (loadgen.py measures that).
+#
+#   python benchmarks/bench_hot_path.py [--sizes 100,1000,10000,100000] [--encoder fake|real]
+#   python benchmarks/bench_hot_path.py --json base.json          # save a run
+#   python benchmarks/bench_hot_path.py --baseline base.json      # fail on regressions
+#
+# Each case reports latency per call (mean / p50 / p95) and the peak memory
+# allocated by one call (tracemalloc, measured in a separate pass):
+#
+#   remove_endings      thai_text.remove_endings
+#   pre_route           app.pre_router.route
+#   webhook_parse       app.webhook_reader.parse + dispatch
+#   compute_similar     knowlege.compute_similar (needs sentence-transformers)
+#   compute_response    app.compute_response                     (cold and cached)
+#   is_similar_query    app.is_similar_query
+#   barista_search      knowlege.compute_response on a hit, exact and IVF index
+#   llm_fallback        app.handle_text_message: greeting miss -> answer cache -> Ollama -> reply
+
+DEFAULT_SIZES = "100,1000,10000,100000"
+REAL_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+CHANNEL_SECRET = "0" * 32
+UID = "U" + "0" * 32
+
+PARTICLES = ["ครับ", "ค่ะ", "นะ", "นะจ้ะ", ""]
+
+
+def sentences(count, prefix):
+    return [f"{prefix} {i} ร้านกาแฟเปิดกี่โมง{PARTICLES[i % len(PARTICLES)]}" for i in range(count)]
+
+
+def measure(fn, inputs, rounds, alloc_samples=20):
+    timings = []
+    for _ in range(rounds):
+        for item in inputs:
+            started = time.perf_counter_ns()
+            fn(item)
+            timings.append(time.perf_counter_ns() - started)
+    timings = np.asarray(timings) / 1000.0
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for item in inputs[:alloc_samples]:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            fn(item)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return {
+        "mean_us": float(timings.mean()),
+        "p50_us": float(np.percentile(timings, 50)),
+        "p95_us": float(np.percentile(timings, 95)),
+        "alloc_kb": float(np.mean(peaks)) / 1024 if peaks else 0.0,
+    }
+
+
+def load_bots(encoder):
+    # app.py and knowlege.py against one FakeGraph; the corpora are swapped
+    # in per size by bench_size.
+    prepare_environment("bench", CHANNEL_SECRET, warmup="off")
+    graph = FakeGraph()
+    bots = {name: import_bot(name, graph=graph, encoder=encoder) for name in ("app", "knowlege")}
+    for bot in bots.values():
+        bot.ollama = FakeOllama()
+    return bots, graph
+
+
+def bench_size_independent(bots, rounds, queries):
+    app, knowlege = bots["app"], bots["knowlege"]
+    results = {}
+    texts = sentences(queries, "สวัสดี")
+    results["remove_endings"] = measure(remove_endings, texts, rounds)
+    results["pre_route"] = measure(app.pre_router.route, texts, rounds)
+
+    # Parse only: the handlers are measured by the cases below.
+    dispatcher = EventDispatcher()
+    dispatcher.on_text(lambda events: None)
+
+    def parse(request):
+        body, signature = request
+        dispatcher.dispatch(app.webhook_reader.parse(body, signature))
+
+    for events in (1, 5):
+        bodies = [webhook_body(sentences(events, f"ข้อความ{i}")) for i in range(queries)]
+        requests = [(body, sign(body, CHANNEL_SECRET)) for body in bodies]
+        results[f"webhook_parse[{events} events]"] = measure(parse, requests, rounds)
+
+    if importlib.util.find_spec("sentence_transformers") is None:
+        print("sentence-transformers not installed, skipping compute_similar")
+    else:
+        pairs = list(zip(sentences(queries, "คำถาม"), sentences(queries, "ประโยค")))
+        results["compute_similar"] = measure(lambda pair: knowlege.compute_similar(*pair), pairs, rounds)
+    return results
+
+
+def bench_size(bots, graph, size, rounds, queries):
+    app, knowlege = bots["app"], bots["knowlege"]
+    results = {}
+    corpus = sentences(size, "คำทักทาย")
+    graph.greetings = {name: f"ตอบ {name}" for name in corpus}
+    graph.barista = {question: f"คำตอบ {question}" for question in corpus}
+    embedding_cache.clear()
+
+    started = time.perf_counter()
+    app.greeting_index.refresh(force=True)
+    build_time = time.perf_counter() - started
+    corpus_vectors = app.greeting_index._state[1]
+
+    cold = sentences(queries * rounds, f"คำถามใหม่{size}")
+    results["compute_response[cold]"] = measure(app.compute_response, cold, 1)
+    hot = sentences(queries, "ทักทายซ้ำ")
+    for sentence in hot:
+        app.compute_response(sentence)
+    results["compute_response[cached]"] = measure(app.compute_response, hot, rounds)
+
+    # Bulk-load the intents from the corpus vectors; register() rebuilds the
+    # matrix on every call, which is quadratic at these sizes.
+    intents = app.intent_registry
+    per_intent = 5
+    intents._phrases = {
+        f"intent{i}": corpus_vectors[i * per_intent:(i + 1) * per_intent]
+        for i in range(max(1, size // per_intent))
+    }
+    intents._rebuild()
+    results["is_similar_query"] = measure(lambda sentence: app.is_similar_query(sentence, "intent0"), hot, rounds)
+
+    hits = corpus[:queries]
+    for kind in ("exact", "ivf"):
+        knowlege.BARISTA_INDEX_KIND = kind
+        if os.path.exists(knowlege.BARISTA_INDEX_PATH):
+            os.remove(knowlege.BARISTA_INDEX_PATH)
+        with contextlib.redirect_stdout(io.StringIO()):
+            knowlege.load_barista_index()
+            # compute_response prints every reply
+            results[f"barista_search[{kind}]"] = measure(lambda sentence: knowlege.compute_response(sentence, UID),
+                                                         hits, rounds)
+
+    app.answer_cache = SemanticAnswerCache(scope="user", maxsize=min(size, 10000))
+    for sentence, vec in zip(corpus[:app.answer_cache.maxsize], corpus_vectors):
+        app.answer_cache.store(vec, f"คำตอบ {sentence}", UID)
+    line_bot_api = FakeLineApi()
+
+    def llm_fallback(sentence):
+        app.handle_text_message(line_bot_api, "0" * 32, UID, sentence, {}, {})
+
+    results["llm_fallback"] = measure(llm_fallback, sentences(queries * rounds, f"ถามต่อ{size}"), 1)
+    return results, build_time
+
+
+def load_encoder(kind, model_name, dim):
+    if kind == "fake":
+        return FakeEncoder(dim)
+    from embedding_backend import load_model
+    return load_model(model_name)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, stats in results.items():
+        before = baseline.get(key)
+        if before and before["mean_us"] > 0 and stats["mean_us"] > before["mean_us"] * (1 + tolerance):
+            regressions.append((key, before["mean_us"], stats["mean_us"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline hot-path microbenchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES)
+    parser.add_argument("--encoder", choices=("fake", "real"), default="fake")
+    parser.add_argument("--model", default=REAL_MODEL)
+    parser.add_argument("--dim", type=int, default=512, help="fake encoder dimension")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs the baseline")
+    args = parser.parse_args()
+
+    encoder = load_encoder(args.encoder, args.model, args.dim)
+    bots, graph = load_bots(encoder)
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = {}
+
+    for name, stats in bench_size_independent(bots, args.rounds, args.queries).items():
+        results[f"{name} @-"] = stats
+    for size in sizes:
+        size_results, build_time = bench_size(bots, graph, size, args.rounds, args.queries)
+        print(f"corpus {size}: greeting index built in {build_time:.2f}s")
+        for name, stats in size_results.items():
+            results[f"{name} @{size}"] = stats
+
+    print(f"\nencoder: {args.encoder}" + (f" ({args.model})" if args.encoder == "real" else f" (dim {args.dim})"))
+    print(f"{'case':<36} {'size':>7} {'mean us':>10} {'p50 us':>10} {'p95 us':>10} {'alloc KB':>9}")
+    for key, stats in results.items():
+        name, size = key.rsplit(" @", 1)
+        print(f"{name:<36} {size:>7} {stats['mean_us']:10.1f} {stats['p50_us']:10.1f} {stats['p95_us']:10.1f} {stats['alloc_kb']:9.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"encoder": args.encoder, "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for key, before, after in regressions:
+            print(f"REGRESSION {key}: {before:.1f}us -> {after:.1f}us")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
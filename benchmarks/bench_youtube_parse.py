@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_search
+
+# Offline check and benchmark of the two YouTube result parsers on saved
+# pages: ytInitialData JSON (HTTP backend) vs BeautifulSoup over the rendered
+# DOM (Selenium backend). Both must produce the same records.
+#
+#   python benchmarks/bench_youtube_parse.py [rounds]
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def timeit(fn, rounds):
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(rounds=50):
+    page = load("youtube_results.html")
+
+    from_json = youtube_search.parse_initial_data(page)
+    from_dom = youtube_search.parse_rendered_html(page)
+    assert from_json, "no results parsed from ytInitialData"
+    assert from_json == from_dom, "ytInitialData and DOM parsers disagree"
+    assert youtube_search.parse_initial_data(page, limit=1) == from_json[:1]
+
+    # A consent/interstitial page has no ytInitialData: the HTTP backend must
+    # raise so search() falls back to the browser.
+    try:
+        youtube_search.parse_initial_data(load("youtube_consent.html"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("consent page should not parse")
+
+    json_time = timeit(lambda: youtube_search.parse_initial_data(page), rounds)
+    dom_time = timeit(lambda: youtube_search.parse_rendered_html(page), rounds)
+    print(f"results parsed        {len(from_json)}")
+    print(f"ytInitialData (json)  {json_time * 1000:8.3f} ms")
+    print(f"BeautifulSoup (dom)   {dom_time * 1000:8.3f} ms")
+    print(f"speed-up              {dom_time / json_time:8.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,141 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+import zlib
+
+import numpy as np
+
+# In-process stand-ins for the services the bots call, so the hot paths can
+# be measured offline: a deterministic encoder, a Neo4j graph answering the
+# bots' read queries from dicts, an Ollama client and a LINE API that only
+# record what they are sent.
+
+
+class FakeEncoder:
+    # Same text -> same unit vector, without a model. `encode` has the
+    # SentenceTransformer signature the caches and indexes call.
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.calls = 0
+        self.sentences = 0
+
+    def _vector(self, text):
+        rng = np.random.default_rng(zlib.crc32(text.encode("utf-8")))
+        return rng.standard_normal(self.dim, dtype=np.float32)
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        self.calls += 1
+        self.sentences += len(texts)
+        vectors = np.vstack([self._vector(text) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+        if normalize_embeddings and len(vectors):
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors[0] if single else vectors
+
+
+class FakeGraph:
+    # Answers the bots' queries (greetings, previous answers, user names,
+    # Barista questions, the startup schema checks) from memory, optionally
+    # after `latency` seconds. Install with `install(db)`; writes are counted
+    # and dropped.
+    def __init__(self, greetings=None, answers=None, users=None, barista=None, latency=0.0):
+        self.greetings = dict(greetings or {})
+        self.answers = dict(answers or {})
+        self.users = dict(users or {})
+        self.barista = dict(barista or {})
+        self.latency = latency
+        self.queries = 0
+        self.writes = 0
+
+    def install(self, db):
+        db.read_query = self.read_query
+        db.write_query = self.write_query
+        db.verify_connectivity = lambda: None
+
+    def read_query(self, query, parameters=None):
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        parameters = parameters or {}
+        if query.startswith("SHOW CONSTRAINTS"):
+            from schema import CONSTRAINTS
+            return [{'name': name} for name in CONSTRAINTS]
+        if query.startswith("SHOW INDEXES"):
+            from schema import INDEXES
+            return [{'name': name, 'state': 'ONLINE'} for name in INDEXES]
+        if "MATCH (n:Barista)" in query and "question" in parameters:
+            reply = self.barista.get(parameters['question'])
+            return [{'reply': reply}] if reply is not None else []
+        if "MATCH (n:Barista)" in query:
+            return [{'question': question, 'reply': reply} for question, reply in sorted(self.barista.items())]
+        if "MATCH (n:Greeting)" in query:
+            return [{'name': name, 'reply': reply} for name, reply in sorted(self.greetings.items())]
+        if "HAS_ANSWER" in query and "questions" in parameters:
+            return [{'question': q, 'answer': self.answers[q]} for q in parameters['questions'] if q in self.answers]
+        if "HAS_ANSWER" in query:
+            answer = self.answers.get(parameters.get('question'))
+            return [{'answer': answer}] if answer is not None else []
+        if "uids" in parameters:
+            return [{'uid': uid, 'name': self.users[uid]} for uid in parameters['uids'] if uid in self.users]
+        raise ValueError(f"FakeGraph does not know this query: {query.strip()[:60]}")
+
+    def write_query(self, query, parameters=None):
+        self.writes += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return []
+
+
+class FakeGeneration:
+    def __init__(self, text):
+        self.text = text
+        self.status_code = 200
+        self.error = None
+        self.ok = True
+
+
+class FakeOllama:
+    def __init__(self, reply="กาแฟคั่วกลางเหมาะกับการชงดริป"):
+        self.reply = reply
+        self.prompts = 0
+
+    def generate(self, prompt, model=None, **kwargs):
+        self.prompts += 1
+        return FakeGeneration(self.reply)
+
+
+class FakeLineApi:
+    def __init__(self):
+        self.replies = []
+
+    def reply_message(self, reply_token, messages, *args, **kwargs):
+        self.replies.append((reply_token, messages))
+
+
+def text_event(text, uid="U0000000000000000000000000000000", token="0" * 32):
+    return {
+        'type': 'message',
+        'replyToken': token,
+        'source': {'type': 'user', 'userId': uid},
+        'timestamp': 1700000000000,
+        'mode': 'active',
+        'webhookEventId': '01H0000000000000000000000',
+        'deliveryContext': {'isRedelivery': False},
+        'message': {'type': 'text', 'id': '1', 'quoteToken': 'q', 'text': text},
+    }
+
+
+def webhook_body(texts, destination="Ubot", first=0):
+    # One event per text; `first` offsets the user ids and reply tokens so
+    # successive bodies do not reuse them.
+    events = [text_event(text, uid=f"U{first + i:032d}", token=f"{first + i:032d}") for i, text in enumerate(texts)]
+    return json.dumps({'destination': destination, 'events': events}, ensure_ascii=False)
+
+
+def sign(body, channel_secret):
+    # X-Line-Signature: base64 HMAC-SHA256 of the body with the channel secret.
+    digest = hmac.new(channel_secret.encode("utf-8"), body.encode("utf-8"), hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
@@ -0,0 +1,284 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH)
+
+from fakes import sign, webhook_body
+from mock_services import MockLineServer, MockOllamaServer
+
+# End-to-end load generator for the LINE webhook of app.py, knowlege.py or
+# miniproject2.py. Replays signed webhook deliveries either open-loop at a
+# target rate (--rps; latency is measured from the scheduled send time, so a
+# backed-up server is not hidden) or closed-loop with a fixed number of
+# clients (--concurrency), and reports p50/p95/p99 latency, error rate and
+# throughput.
+#
+# The bots answer 200 even when handling an event fails, so the error rate
+# is per event and also counts what the mock LINE server saw: replies it
+# rejected and, when the bot was started here and every event is ours,
+# events that never got a reply at all.
+#
+# Against a bot that is already running:
+#
+#   python benchmarks/loadgen.py --url http://127.0.0.1:5000/ --secret <channel secret> --rps 20 --duration 30
+#
+# Or let it start the mock LINE / Ollama servers and the bot (serve_bot.py,
+# stand-in graph) itself, for a repeatable capacity number per release:
+#
+#   python benchmarks/loadgen.py --bot app --encoder fake --concurrency 16 --duration 60 --json app.json
+#
+# Messages are drawn from fixtures/match_corpus.json (greeting and Barista
+# paraphrases) plus a share of novel questions that take the LLM fallback.
+
+CORPUS = os.path.join(BENCH, "fixtures", "match_corpus.json")
+
+
+def load_messages(path):
+    with open(path, encoding="utf-8") as f:
+        match_sets = json.load(f)
+    return [query for match_set in match_sets.values() for query, _ in match_set["queries"]]
+
+
+class LoadGenerator:
+    def __init__(self, url, secret, messages, novel_ratio=0.2, events_per_request=1, timeout=60):
+        self.url = url
+        self.secret = secret
+        self.messages = messages
+        self.novel_ratio = novel_ratio
+        self.events_per_request = events_per_request
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=512)
+        self.session.mount("http://", adapter)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._random = random.Random(7)
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+        self.sent = 0
+
+    def _body(self):
+        with self._lock:
+            first = next(self._ids) * self.events_per_request
+            texts = []
+            for i in range(self.events_per_request):
+                if self._random.random() < self.novel_ratio:
+                    texts.append(f"คำถามใหม่ที่ {first + i} เกี่ยวกับกาแฟ")
+                else:
+                    texts.append(self._random.choice(self.messages))
+        body = webhook_body(texts, first=first)
+        return body, sign(body, self.secret)
+
+    def send(self, scheduled=None):
+        body, signature = self._body()
+        started = scheduled if scheduled is not None else time.perf_counter()
+        status = None
+        try:
+            response = self.session.post(self.url, data=body.encode("utf-8"), timeout=self.timeout, headers={
+                "Content-Type": "application/json",
+                "X-Line-Signature": signature,
+            })
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        latency = time.perf_counter() - started
+        with self._lock:
+            self.sent += 1
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors += 1
+
+    def run_rate(self, rps, duration, max_inflight=256):
+        # Open loop: requests go out on schedule whatever the response times.
+        interval = 1.0 / rps
+        total = int(rps * duration)
+        with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+            start = time.perf_counter()
+            for i in range(total):
+                scheduled = start + i * interval
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, scheduled)
+        return time.perf_counter() - start
+
+    def run_concurrency(self, clients, duration):
+        # Closed loop: each client sends its next request when the last one returns.
+        deadline = time.perf_counter() + duration
+
+        def client():
+            while time.perf_counter() < deadline:
+                self.send()
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def report(self, elapsed, line=None, expect_replies=False):
+        # `line`: the mock LINE server's counters; `expect_replies` when each
+        # of our events should have produced exactly one reply there.
+        latencies = np.asarray(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        events = self.sent * self.events_per_request
+        failed = self.errors * self.events_per_request
+        invalid = unanswered = None
+        if line is not None:
+            invalid = line.get("invalid", 0)
+            if expect_replies:
+                # Also covers rejected replies and failed requests.
+                unanswered = max(events - line.get("replies", 0), 0)
+                failed = max(failed, unanswered)
+            else:
+                failed += invalid
+        return {
+            "requests": self.sent,
+            "events": events,
+            "errors": self.errors,
+            "invalid_replies": invalid,
+            "unanswered_events": unanswered,
+            "failed_events": failed,
+            "error_rate": failed / events if events else 0.0,
+            "throughput_rps": self.sent / elapsed if elapsed else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "max_ms": float(latencies.max()),
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+        }
+
+
+def wait_ready(base_url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"bot exited with code {process.returncode}")
+        try:
+            if requests.get(base_url + "readyz", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"bot not ready after {timeout}s")
+
+
+def wait_replies(line, events, timeout=60, idle=2.0):
+    # Replies can still be on their way after the last 200 (--async-webhook):
+    # wait until every event is answered, or nothing changed for `idle` s.
+    deadline = time.monotonic() + timeout
+    last, changed_at = None, time.monotonic()
+    while time.monotonic() < deadline:
+        stats = line.stats()
+        answered = stats.get("replies", 0) + stats.get("invalid", 0)
+        if answered >= events:
+            break
+        if answered != last:
+            last, changed_at = answered, time.monotonic()
+        elif time.monotonic() - changed_at >= idle:
+            break
+        time.sleep(0.2)
+    return line.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a bot's LINE webhook")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/")
+    parser.add_argument("--secret", default="loadtest-secret")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rps", type=float, help="open-loop target rate")
+    mode.add_argument("--concurrency", type=int, default=8, help="closed-loop clients")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--events", type=int, default=1, help="events per webhook delivery")
+    parser.add_argument("--novel-ratio", type=float, default=0.2, help="share of messages that miss every corpus")
+    parser.add_argument("--messages", default=CORPUS)
+    parser.add_argument("--line-stats", help="GET URL of a running mock LINE server's /stats")
+    parser.add_argument("--json", help="write the report to this file")
+    spawn = parser.add_argument_group("start the mocks and the bot (serve_bot.py)")
+    spawn.add_argument("--bot", choices=("app", "knowlege", "miniproject2"))
+    spawn.add_argument("--port", type=int, default=5055)
+    spawn.add_argument("--encoder", choices=("fake", "real"), default="real")
+    spawn.add_argument("--graph-latency-ms", type=float, default=2)
+    spawn.add_argument("--line-latency-ms", type=float, default=30)
+    spawn.add_argument("--ollama-ttft-ms", type=float, default=300)
+    spawn.add_argument("--ollama-token-ms", type=float, default=20)
+    spawn.add_argument("--async-webhook", action="store_true")
+    spawn.add_argument("--ready-timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    process = line = ollama = None
+    url, line_stats = args.url, args.line_stats
+    if args.bot:
+        line = MockLineServer(args.line_latency_ms).start()
+        ollama = MockOllamaServer(args.ollama_ttft_ms, args.ollama_token_ms).start()
+        command = [sys.executable, os.path.join(BENCH, "serve_bot.py"), args.bot,
+                   "--port", str(args.port), "--secret", args.secret,
+                   "--line-url", line.url, "--ollama-url", ollama.url,
+                   "--encoder", args.encoder, "--graph-latency-ms", str(args.graph_latency_ms)]
+        if args.async_webhook:
+            command.append("--async-webhook")
+        process = subprocess.Popen(command)
+        url = f"http://127.0.0.1:{args.port}/"
+        line_stats = None
+
+    try:
+        if process is not None:
+            wait_ready(url, process, args.ready_timeout)
+        generator = LoadGenerator(url, args.secret, load_messages(args.messages), args.novel_ratio, args.events)
+        if args.rps:
+            elapsed = generator.run_rate(args.rps, args.duration)
+        else:
+            elapsed = generator.run_concurrency(args.concurrency, args.duration)
+        if line is not None:
+            line_counts = wait_replies(line, generator.sent * generator.events_per_request)
+            report = generator.report(elapsed, line_counts, expect_replies=True)
+            report["line"] = line_counts
+            report["ollama"] = ollama.stats()
+        elif line_stats:
+            line_counts = requests.get(line_stats, timeout=5).json()
+            report = generator.report(elapsed, line_counts)
+            report["line"] = line_counts
+        else:
+            report = generator.report(elapsed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        for mock in (line, ollama):
+            if mock is not None:
+                mock.shutdown()
+
+    load = f"{args.rps} rps" if args.rps else f"{args.concurrency} clients"
+    print(f"\n{args.bot or url}: {load}, {args.duration:.0f}s, {args.events} event(s) per request")
+    print(f"requests    {report['requests']}  ({report['events']} events)")
+    print(f"throughput  {report['throughput_rps']:.1f} req/s")
+    print(f"errors      {report['failed_events']} failed events ({report['error_rate']:.2%}), "
+          f"{report['errors']} HTTP errors  statuses {report['statuses']}")
+    print(f"latency ms  p50 {report['p50_ms']:.1f}  p95 {report['p95_ms']:.1f}  p99 {report['p99_ms']:.1f}  max {report['max_ms']:.1f}")
+    if "line" in report:
+        replies = report["line"].get("replies", 0)
+        print(f"LINE        {replies} replies for {report['events']} events  {report['line']}")
+    if "ollama" in report:
+        print(f"Ollama      {report['ollama']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-ins for the external HTTP services the bots call, for load
+# tests: the LINE reply API (point the bots at it with LINE_API_ENDPOINT) and
+# Ollama's /api/generate (OLLAMA_URL). Both add a configurable latency and
+# count what they served; GET /stats returns the counters.
+#
+#   python benchmarks/mock_services.py [--line-port 8081] [--ollama-port 11435]
+#                                      [--line-latency-ms 30] [--ollama-ttft-ms 300] [--ollama-token-ms 20]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.server.mock.stats())
+        else:
+            self._send_json(404, {"message": "Not found"})
+
+
+class _Mock:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def serve(self, handler, host, port):
+        server = ThreadingHTTPServer((host, port), handler)
+        server.daemon_threads = True
+        server.mock = self
+        thread = threading.Thread(target=server.serve_forever, name=type(self).__name__, daemon=True)
+        thread.start()
+        self.server = server
+        return server
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _LineHandler(_Handler):
+    def do_POST(self):
+        mock = self.server.mock
+        if self.path != "/v2/bot/message/reply":
+            self._send_json(404, {"message": "Not found"})
+            return
+        payload = self._read_json()
+        time.sleep(mock.latency)
+        if not payload.get("replyToken") or not payload.get("messages"):
+            mock.count("invalid")
+            self._send_json(400, {"message": "Invalid reply token"})
+            return
+        if len(payload["messages"]) > 5:
+            mock.count("invalid")
+            self._send_json(400, {"message": "Size must be between 1 and 5"})
+            return
+        mock.count("replies")
+        mock.count(f"messages_{len(payload['messages'])}")
+        self._send_json(200, {})
+
+
+class MockLineServer(_Mock):
+    def __init__(self, latency_ms=30):
+        super().__init__()
+        self.latency = latency_ms / 1000.0
+
+    def start(self, host="127.0.0.1", port=0):
+        self.serve(_LineHandler, host, port)
+        return self
+
+
+class _OllamaHandler(_Handler):
+    def do_POST(self):
+        mock = self.server.mock
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        payload = self._read_json()
+        mock.count("requests")
+        tokens = mock.reply.split(" ")
+        time.sleep(mock.ttft)
+        if not payload.get("stream", True):
+            time.sleep(mock.token_delay * (len(tokens) - 1))
+            self._send_json(200, {"model": payload.get("model"), "response": mock.reply, "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(mock.token_delay)
+                self._chunk({"response": token if i == 0 else " " + token, "done": False})
+            self._chunk({"response": "", "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading (word/char budget reached).
+            mock.count("cancelled")
+            self.close_connection = True
+
+    def _chunk(self, payload):
+        data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockOllamaServer(_Mock):
+    def __init__(self, ttft_ms=300, token_ms=20, reply="กาแฟ คั่ว กลาง เหมาะ กับ การ ชง ดริป ค่ะ"):
+        super().__init__()
+        self.ttft = ttft_ms / 1000.0
+        self.token_delay = token_ms / 1000.0
+        self.reply = reply
+
+    def start(self, host="127.0.0.1", port=0):
+        self.serve(_OllamaHandler, host, port)
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock LINE reply API and Ollama servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--line-port", type=int, default=8081)
+    parser.add_argument("--ollama-port", type=int, default=11435)
+    parser.add_argument("--line-latency-ms", type=float, default=30)
+    parser.add_argument("--ollama-ttft-ms", type=float, default=300)
+    parser.add_argument("--ollama-token-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    line = MockLineServer(args.line_latency_ms).start(args.host, args.line_port)
+    ollama = MockOllamaServer(args.ollama_ttft_ms, args.ollama_token_ms).start(args.host, args.ollama_port)
+    print(f"LINE_API_ENDPOINT={line.url}")
+    print(f"OLLAMA_URL={ollama.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH))
+
+from fakes import FakeEncoder, FakeGraph
+
+# Runs one of the bots for a load test. Credentials, the LINE API endpoint
+# and the Ollama URL come from the command line, state files go to a scratch
+# directory, and optionally the graph and the encoder are replaced by the
+# in-process stand-ins from fakes.py (seeded from fixtures/match_corpus.json).
+#
+#   python benchmarks/serve_bot.py app --line-url http://127.0.0.1:8081 --ollama-url http://127.0.0.1:11435
+#
+# Warm-up runs before the server starts, so /readyz is 200 once it listens.
+
+BOTS = ("app", "knowlege", "miniproject2")
+CORPUS = os.path.join(BENCH, "fixtures", "match_corpus.json")
+
+
+def stand_in_graph(latency_ms):
+    with open(CORPUS, encoding="utf-8") as f:
+        match_sets = json.load(f)
+    greetings = {name: f"{name} เช่นกัน" for name in match_sets["greeting"]["corpus"]}
+    barista = {question: f"คำตอบเรื่อง {question}" for question in match_sets["barista"]["corpus"]}
+    return FakeGraph(greetings=greetings, barista=barista, latency=latency_ms / 1000.0)
+
+
+def prepare_environment(bot, secret, line_url=None, ollama_url=None, warmup="blocking", async_webhook=False):
+    # Credentials and state files for one bot in a scratch directory. Must
+    # run before the bot (and write_behind / embedding_store) is imported.
+    scratch = tempfile.mkdtemp(prefix=f"loadtest-{bot}-")
+    credentials = os.path.join(scratch, "line.txt")
+    with open(credentials, "w") as f:
+        f.write(f"loadtest-token\n{secret}\n")
+    os.environ.update({
+        "LINE_CREDENTIALS_FILE": credentials,
+        "LINE_CHANNEL_ACCESS_TOKEN": "loadtest-token",
+        "LINE_CHANNEL_SECRET": secret,
+        "WARMUP_MODE": warmup,
+        "EMBEDDING_STORE_DIR": os.path.join(scratch, "embedding_store"),
+        "BARISTA_INDEX_PATH": os.path.join(scratch, "barista_index.npz"),
+        "WRITE_BEHIND_SPILL_PATH": os.path.join(scratch, "write_behind.spill.jsonl"),
+    })
+    if line_url:
+        os.environ["LINE_API_ENDPOINT"] = line_url
+    if ollama_url:
+        os.environ["OLLAMA_URL"] = ollama_url
+    if async_webhook:
+        os.environ["ASYNC_WEBHOOK"] = "1"
+    return scratch
+
+
+def import_bot(bot, graph=None, encoder=None):
+    # Imports app / knowlege / miniproject2 with `graph` (a FakeGraph)
+    # answering its Neo4j queries and `encoder` standing in for its model.
+    if graph is not None:
+        import db
+        graph.install(db)
+    if encoder is not None:
+        import embedding_service
+        embedding_service.embedding_model = lambda name, *a, **k: encoder
+    return importlib.import_module(bot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a bot against local stand-ins")
+    parser.add_argument("bot", choices=BOTS)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--secret", default="loadtest-secret")
+    parser.add_argument("--line-url", required=True, help="LINE API endpoint (mock)")
+    parser.add_argument("--ollama-url", required=True, help="Ollama base URL (mock)")
+    parser.add_argument("--graph", choices=("fake", "neo4j"), default="fake")
+    parser.add_argument("--graph-latency-ms", type=float, default=2)
+    parser.add_argument("--encoder", choices=("fake", "real"), default="real")
+    parser.add_argument("--async-webhook", action="store_true", help="set ASYNC_WEBHOOK=1")
+    args = parser.parse_args()
+
+    scratch = prepare_environment(args.bot, args.secret, args.line_url, args.ollama_url,
+                                  async_webhook=args.async_webhook)
+    graph = stand_in_graph(args.graph_latency_ms) if args.graph == "fake" else None
+    encoder = None
+    if args.encoder == "fake":
+        from embedding_service import MicroBatcher
+        encoder = MicroBatcher(FakeEncoder())
+
+    module = import_bot(args.bot, graph=graph, encoder=encoder)
+    print(f"{args.bot} ready on http://{args.host}:{args.port}/ (scratch dir {scratch})", flush=True)
+    module.app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
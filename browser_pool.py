@@ -0,0 +1,167 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+
+# Pool of warm headless Chrome drivers shared by every YouTube scraper.
+# Drivers are started lazily (or up front with warm()), handed out with a
+# checkout timeout, and recycled after `max_uses` checkouts or once their
+# session is dead, instead of launching and quitting Chrome for every search.
+# Errors from the page itself (NoSuchElementException, TimeoutException when
+# YouTube changes its layout) leave a working browser, which goes back to the
+# pool.
+
+POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+MAX_USES = int(os.environ.get("BROWSER_MAX_USES", "50"))
+CHECKOUT_TIMEOUT = float(os.environ.get("BROWSER_CHECKOUT_TIMEOUT", "30"))
+
+
+def chrome_options():
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')  # Run Chrome in headless mode
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    return options
+
+
+class BrowserPool:
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES, checkout_timeout=CHECKOUT_TIMEOUT, options=chrome_options):
+        self.size = size
+        self.max_uses = max_uses
+        self.checkout_timeout = checkout_timeout
+        self.options = options
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._installed = False
+        self.checkouts = 0
+        self.recycled = 0
+        self.crashed = 0
+
+    def _install(self):
+        # Caller holds the lock; only the first driver pays for this.
+        if not self._installed:
+            import chromedriver_autoinstaller
+            chromedriver_autoinstaller.install()
+            self._installed = True
+
+    def _launch(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._install()
+            self._created += 1
+        try:
+            return [webdriver.Chrome(options=self.options()), 0]
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _discard(self, entry):
+        with self._lock:
+            self._created -= 1
+        try:
+            entry[0].quit()
+        except Exception:
+            pass
+
+    def warm(self):
+        # Start drivers until the pool is full.
+        while True:
+            entry = self._launch()
+            if entry is None:
+                return self
+            self._idle.put(entry)
+
+    def checkout(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+                break
+            except queue.Empty:
+                pass
+            # A slot frees up when a driver is recycled, so keep retrying
+            # the launch while waiting for an idle driver.
+            entry = self._launch()
+            if entry is not None:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No browser available after {timeout}s")
+            try:
+                entry = self._idle.get(timeout=min(remaining, 0.5))
+                break
+            except queue.Empty:
+                pass
+        with self._lock:
+            self.checkouts += 1
+        return entry
+
+    def checkin(self, entry, broken=False):
+        entry[1] += 1
+        if broken:
+            with self._lock:
+                self.crashed += 1
+            self._discard(entry)
+        elif entry[1] >= self.max_uses:
+            with self._lock:
+                self.recycled += 1
+            self._discard(entry)
+        else:
+            self._idle.put(entry)
+
+    def _alive(self, driver, error):
+        # After a WebDriverException: is the session still usable?
+        if isinstance(error, InvalidSessionIdException):
+            return False
+        try:
+            driver.title
+        except Exception:
+            return False
+        return True
+
+    @contextmanager
+    def driver(self, timeout=None):
+        entry = self.checkout(timeout)
+        try:
+            yield entry[0]
+        except WebDriverException as e:
+            self.checkin(entry, broken=not self._alive(entry[0], e))
+            raise
+        except BaseException:
+            self.checkin(entry)
+            raise
+        else:
+            self.checkin(entry)
+
+    def close(self):
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(entry)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "recycled": self.recycled,
+                "crashed": self.crashed,
+            }
+
+
+# Process-wide pool shared by every scraper.
+browser_pool = BrowserPool()
+atexit.register(browser_pool.close)
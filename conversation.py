@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import db
+from write_behind import journal, timestamp
+
+# Per-user conversation memory for LLM prompts. Each uid gets a ring buffer
+# of its latest turns; history() returns only the newest turns that fit the
+# token budget, so prompt size stays flat however long the process runs.
+# Users idle for longer than `idle_ttl` are dropped, and with persist=True
+# every turn is also queued on the write-behind journal ("turn" rows) and
+# reloaded from Neo4j the next time the user shows up.
+
+MAX_TURNS = int(os.environ.get("CONVERSATION_MAX_TURNS", "20"))
+MAX_TOKENS = int(os.environ.get("CONVERSATION_MAX_TOKENS", "400"))
+IDLE_TTL = float(os.environ.get("CONVERSATION_IDLE_TTL", "1800"))
+MAX_USERS = int(os.environ.get("CONVERSATION_MAX_USERS", "10000"))
+PERSIST = os.environ.get("CONVERSATION_PERSIST") == "1"
+# Rough size of a token; Thai text has no spaces, so count characters.
+CHARS_PER_TOKEN = float(os.environ.get("CONVERSATION_CHARS_PER_TOKEN", "2"))
+
+LOAD_TURNS_QUERY = '''
+MATCH (:User {uid: $uid})-[:SAID]->(t:Turn)
+RETURN t.role AS role, t.text AS text
+ORDER BY t.timestamp DESC
+LIMIT $limit
+'''
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+class ConversationStore:
+    def __init__(self, max_turns=MAX_TURNS, max_tokens=MAX_TOKENS, idle_ttl=IDLE_TTL,
+                 max_users=MAX_USERS, persist=PERSIST, summarize=None):
+        # summarize(summary, dropped_turns) -> str, optional: folds turns that
+        # fall out of the ring buffer into a running summary instead of
+        # losing them.
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.idle_ttl = idle_ttl
+        self.max_users = max_users
+        self.persist = persist
+        self.summarize = summarize
+        self._users = OrderedDict()
+        self._summaries = {}
+        self._swept_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def _load(self, uid):
+        # Saved turns of a user that is not in memory, or None. Read before
+        # taking the lock so a Neo4j round trip only holds up this user.
+        if not self.persist or uid is None or uid in self._users:
+            return None
+        records = db.read_query(LOAD_TURNS_QUERY, {'uid': uid, 'limit': self.max_turns})
+        return [f"{record['role']}:{record['text']}" for record in reversed(records)]
+
+    def _turns(self, uid, loaded=None):
+        # Caller holds the lock. `loaded` is what _load() returned; it is
+        # ignored if another thread put the user back in memory meanwhile.
+        entry = self._users.get(uid)
+        if entry is None:
+            turns = deque(loaded or (), maxlen=self.max_turns)
+            entry = self._users[uid] = [turns, 0.0]
+        entry[1] = time.monotonic()
+        self._users.move_to_end(uid)
+        return entry[0]
+
+    def append(self, uid, role, text):
+        loaded = self._load(uid)
+        with self._lock:
+            turns = self._turns(uid, loaded)
+            if self.summarize is not None and len(turns) == turns.maxlen:
+                self._summaries[uid] = self.summarize(self._summaries.get(uid, ""), [turns[0]])
+            turns.append(f"{role}:{text}")
+            self._evict()
+        if self.persist and uid is not None:
+            journal.submit("turn", {'uid': uid, 'role': role, 'text': text, 'timestamp': timestamp()})
+
+    def history(self, uid):
+        # Newest turns that fit in max_tokens, oldest first.
+        loaded = self._load(uid)
+        with self._lock:
+            turns = list(self._turns(uid, loaded))
+            summary = self._summaries.get(uid)
+        budget = self.max_tokens
+        if summary:
+            budget -= estimate_tokens(summary)
+        kept = []
+        for turn in reversed(turns):
+            cost = estimate_tokens(turn)
+            if cost > budget:
+                break
+            budget -= cost
+            kept.append(turn)
+        kept.reverse()
+        if summary:
+            kept.insert(0, f"summary:{summary}")
+        return kept
+
+    def forget(self, uid):
+        with self._lock:
+            self._users.pop(uid, None)
+            self._summaries.pop(uid, None)
+
+    def _evict(self):
+        # Caller holds the lock. Users are kept in last-access order, so the
+        # idle ones are always at the front.
+        now = time.monotonic()
+        while len(self._users) > self.max_users:
+            uid, _ = self._users.popitem(last=False)
+            self._summaries.pop(uid, None)
+        if now - self._swept_at < min(self.idle_ttl, 60):
+            return
+        self._swept_at = now
+        while self._users:
+            uid, (_, last_seen) = next(iter(self._users.items()))
+            if now - last_seen < self.idle_ttl:
+                break
+            del self._users[uid]
+            self._summaries.pop(uid, None)
@@ -0,0 +1,98 @@
+import atexit
+import os
+import threading
+
+from neo4j import GraphDatabase
+
+import metrics
+
+# Shared Neo4j access for all the bots. One driver per process, reused by
+# every query, so a webhook borrows pooled connections instead of paying a
+# fresh TCP + Bolt handshake on each call.
+
+URI = os.environ.get("NEO4J_URI", "neo4j://localhost:7999")
+AUTH = (os.environ.get("NEO4J_USER", "neo4j"), os.environ.get("NEO4J_PASSWORD", "password"))
+
+POOL_OPTIONS = {
+    "max_connection_pool_size": int(os.environ.get("NEO4J_MAX_POOL_SIZE", "50")),
+    "connection_acquisition_timeout": float(os.environ.get("NEO4J_ACQUISITION_TIMEOUT", "30")),
+    "max_connection_lifetime": float(os.environ.get("NEO4J_MAX_CONNECTION_LIFETIME", "3600")),
+    "connection_timeout": float(os.environ.get("NEO4J_CONNECTION_TIMEOUT", "15")),
+}
+
+_driver = None
+_lock = threading.Lock()
+_config = {"uri": URI, "auth": AUTH, "pool": dict(POOL_OPTIONS)}
+
+
+def configure(uri=None, auth=None, **pool_options):
+    # Must be called before the first query; the bots call it at import time
+    # with their own URI/AUTH.
+    global _driver
+    with _lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+        if uri is not None:
+            _config["uri"] = uri
+        if auth is not None:
+            _config["auth"] = auth
+        _config["pool"].update(pool_options)
+
+
+def get_driver():
+    global _driver
+    if _driver is None:
+        with _lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(_config["uri"], auth=_config["auth"], **_config["pool"])
+    return _driver
+
+
+def verify_connectivity():
+    # Health check, run once at startup rather than on every query.
+    get_driver().verify_connectivity()
+
+
+def _collect(tx, query, parameters):
+    return [record for record in tx.run(query, parameters)]
+
+
+def read_query(query, parameters=None):
+    with metrics.span("neo4j.read"), get_driver().session() as session:
+        return session.execute_read(_collect, query, parameters or {})
+
+
+def write_query(query, parameters=None):
+    with metrics.span("neo4j.write"), get_driver().session() as session:
+        return session.execute_write(_collect, query, parameters or {})
+
+
+def close():
+    global _driver
+    with _lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+
+atexit.register(close)
+
+# Drivers a forked child (WEBHOOK_WORKER_KIND=process) inherited from its
+# parent. Their pooled sockets are still the parent's connections, so the
+# child opens its own driver on first use and never closes these: close()
+# would say GOODBYE on the parent's sessions. Kept here so they are not
+# garbage collected (and closed) either.
+_inherited = []
+
+
+def _reset_after_fork():
+    global _driver, _lock
+    if _driver is not None:
+        _inherited.append(_driver)
+    _driver = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
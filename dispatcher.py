@@ -0,0 +1,45 @@
+import traceback
+
+# Routes every event of a LINE webhook delivery, not just events[0]. Text
+# messages are collected and handed over as one list so the bot can encode
+# them in a single model call and look them up with one UNWIND query; any
+# other event type goes to the handler registered for it, one at a time.
+
+
+def is_text_message(event):
+    return event.get('type') == 'message' and event.get('message', {}).get('type') == 'text'
+
+
+class EventDispatcher:
+    def __init__(self):
+        self._handlers = {}
+        self._text_handler = None
+
+    def on(self, event_type):
+        # Register a handler for one event type, e.g. "follow" or "postback".
+        def register(handler):
+            self._handlers[event_type] = handler
+            return handler
+        return register
+
+    def on_text(self, handler):
+        # Register the batch handler that receives all text message events.
+        self._text_handler = handler
+        return handler
+
+    def dispatch(self, json_data):
+        texts = []
+        for event in json_data.get('events', []):
+            if is_text_message(event):
+                texts.append(event)
+                continue
+            handler = self._handlers.get(event.get('type'))
+            if handler is None:
+                continue
+            try:
+                handler(event)
+            except Exception:
+                traceback.print_exc()
+        if texts and self._text_handler is not None:
+            self._text_handler(texts)
+        return len(texts)
@@ -0,0 +1,74 @@
+import glob
+import os
+
+# How the SentenceTransformer behind `model` is loaded.
+#
+# EMBEDDING_BACKEND=torch  the PyTorch fp32 model (default)
+# EMBEDDING_BACKEND=onnx   the transformer exported to ONNX and run by
+#                          onnxruntime; EMBEDDING_QUANTIZE=1 additionally
+#                          applies dynamic int8 quantization to its weights
+#
+# The export is done once and kept under EMBEDDING_ONNX_DIR; pooling and the
+# Dense head of distiluse stay in sentence-transformers, so vectors keep the
+# same shape and normalization. Needs sentence-transformers >= 3.2 with the
+# onnx extra (`pip install "sentence-transformers[onnx]"`).
+#
+# EMBEDDING_QUANTIZE_CONFIG picks the optimum quantization preset for the CPU
+# (arm64, avx2, avx512, avx512_vnni).
+
+BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+QUANTIZE = os.environ.get("EMBEDDING_QUANTIZE") == "1"
+QUANTIZE_CONFIG = os.environ.get("EMBEDDING_QUANTIZE_CONFIG", "avx2")
+ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", "onnx_models")
+
+BACKENDS = ("torch", "onnx")
+
+
+def export_dir(model_name, onnx_dir=ONNX_DIR):
+    return os.path.join(onnx_dir, model_name.replace("/", "__"))
+
+
+def _onnx_file(path, suffix):
+    matches = sorted(glob.glob(os.path.join(path, "onnx", f"model*{suffix}.onnx")))
+    return os.path.relpath(matches[0], path) if matches else None
+
+
+def export_onnx(model_name, quantize=QUANTIZE, quantize_config=QUANTIZE_CONFIG, onnx_dir=ONNX_DIR):
+    # Returns (directory, onnx file relative to it); reuses an earlier export.
+    from sentence_transformers import SentenceTransformer
+
+    path = export_dir(model_name, onnx_dir)
+    if not os.path.exists(os.path.join(path, "onnx", "model.onnx")):
+        # With no ONNX file in the repo, sentence-transformers exports one.
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(path)
+    file_name = "onnx/model.onnx"
+    if quantize:
+        suffix = f"qint8_{quantize_config}"
+        quantized = _onnx_file(path, suffix)
+        if quantized is None:
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            model = SentenceTransformer(path, backend="onnx", model_kwargs={"file_name": file_name})
+            export_dynamic_quantized_onnx_model(model, quantize_config, path, file_suffix=suffix)
+            quantized = _onnx_file(path, suffix)
+            if quantized is None:
+                raise RuntimeError(f"Quantized ONNX model not found under {path}")
+        file_name = quantized
+    return path, file_name
+
+
+def load_model(model_name, backend=BACKEND, quantize=QUANTIZE):
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'")
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    path, file_name = export_onnx(model_name, quantize)
+    return SentenceTransformer(path, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def describe(backend=BACKEND, quantize=QUANTIZE):
+    if backend == "onnx" and quantize:
+        return f"onnx-int8 ({QUANTIZE_CONFIG})"
+    return backend
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Bounded LRU + TTL cache for query embeddings, keyed on the model name and the
+# normalized message. Users send the same short messages over and over, so
+# most of them never need another forward pass.
+
+MAX_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "10000"))
+TTL = float(os.environ.get("EMBEDDING_CACHE_TTL", "3600"))
+
+
+def normalize(text):
+    # Whitespace only: the models are cased, so case still matters.
+    return " ".join(text.split())
+
+
+class EmbeddingCache:
+    def __init__(self, maxsize=MAX_SIZE, ttl=TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                vec, expires = entry
+                if expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return vec
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, vec):
+        with self._lock:
+            self._data[key] = (vec, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def encode(self, model, model_name, text):
+        text = normalize(text)
+        key = (model_name, text)
+        vec = self.get(key)
+        if vec is None:
+            vec = model.encode(text, normalize_embeddings=True)
+            vec.setflags(write=False)  # shared between callers
+            self.put(key, vec)
+        return vec
+
+    def encode_many(self, model, model_name, texts):
+        # All misses go through one model.encode call.
+        texts = [normalize(text) for text in texts]
+        vecs = [self.get((model_name, text)) for text in texts]
+        missing = list(dict.fromkeys(text for text, vec in zip(texts, vecs) if vec is None))
+        if missing:
+            encoded = dict(zip(missing, model.encode(missing, normalize_embeddings=True)))
+            for text, vec in encoded.items():
+                vec.setflags(write=False)
+                self.put((model_name, text), vec)
+            vecs = [encoded[text] if vec is None else vec for text, vec in zip(texts, vecs)]
+        return vecs
+
+
+# Process-wide cache shared by every caller.
+embedding_cache = EmbeddingCache()
+
+
+def encode_cached(model, model_name, text):
+    return embedding_cache.encode(model, model_name, text)
+
+
+def encode_many_cached(model, model_name, texts):
+    return embedding_cache.encode_many(model, model_name, texts)
@@ -0,0 +1,292 @@
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import numpy as np
+
+from startup import LazyModel
+from embedding_backend import load_model
+
+# Shared embedding service. MicroBatcher wraps a SentenceTransformer and
+# gathers concurrent encode() calls into one model.encode per micro-batch
+# (up to max_batch_size sentences, waiting at most max_wait_ms for more), so
+# webhook threads that each encode one sentence share a forward pass.
+#
+# To keep a single copy of the model per machine instead of one per Flask
+# worker, run the service on a Unix socket:
+#
+#   python embedding_service.py --model <name> [--model <name>] --socket /tmp/embeddings.sock
+#
+# and set EMBEDDING_SOCKET in the bots; embedding_model() then hands them an
+# EmbeddingClient instead of an in-process MicroBatcher. Both expose the
+# encode() signature the rest of the code already calls. Models load through
+# embedding_backend, so EMBEDDING_BACKEND=onnx applies to both.
+
+MAX_BATCH_SIZE = int(os.environ.get("EMBEDDING_MAX_BATCH_SIZE", "32"))
+MAX_WAIT_MS = float(os.environ.get("EMBEDDING_MAX_WAIT_MS", "5"))
+SOCKET_PATH = os.environ.get("EMBEDDING_SOCKET") or None
+CLIENT_TIMEOUT = float(os.environ.get("EMBEDDING_CLIENT_TIMEOUT", "30"))
+
+_HEADER = struct.Struct("!I")
+
+
+def _single(sentences):
+    return isinstance(sentences, str)
+
+
+# Batchers alive in this process. A forked child (WEBHOOK_WORKER_KIND=process)
+# inherits them without their worker thread, so they are reset after fork.
+_batchers = weakref.WeakSet()
+# Socket clients, whose per-thread connections are dropped after fork too.
+_clients = weakref.WeakSet()
+
+
+class MicroBatcher:
+    def __init__(self, model, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._reset()
+        _batchers.add(self)
+        self.requests = 0
+        self.sentences = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+
+    def _reset(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._thread.start()
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        if kwargs:
+            # Options the batcher does not group on go straight to the model.
+            return self.model.encode(sentences, normalize_embeddings=normalize_embeddings, **kwargs)
+        texts = [sentences] if _single(sentences) else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        self._ensure_started()
+        future = Future()
+        self._queue.put((texts, bool(normalize_embeddings), future))
+        vectors = future.result()
+        return vectors[0] if _single(sentences) else vectors
+
+    def _collect(self):
+        # Blocks for the first request, then takes whatever else arrives
+        # within max_wait until the batch is full.
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            for normalize in (False, True):
+                group = [request for request in batch if request[1] == normalize]
+                if group:
+                    self._encode_group(group, normalize)
+
+    def _encode_group(self, group, normalize):
+        texts = [text for request in group for text in request[0]]
+        try:
+            vectors = np.asarray(self.model.encode(texts, normalize_embeddings=normalize), dtype=np.float32)
+        except Exception as e:
+            for _, _, future in group:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self.requests += len(group)
+            self.sentences += len(texts)
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(texts))
+        start = 0
+        for request_texts, _, future in group:
+            # A copy, so a cached vector does not keep the whole batch alive.
+            future.set_result(vectors[start:start + len(request_texts)].copy())
+            start += len(request_texts)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "sentences": self.sentences,
+                "batches": self.batches,
+                "mean_batch": self.sentences / self.batches if self.batches else 0.0,
+                "max_batch": self.max_batch_seen,
+                "queued": self._queue.qsize(),
+            }
+
+
+
+
+def _reset_after_fork():
+    for batcher in list(_batchers):
+        batcher._reset()
+    for client in list(_clients):
+        client._local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _send(sock, payload):
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("embedding service closed the connection")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recv(sock):
+    (size,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return _recv_exactly(sock, size)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    # One thread per connection; connections are kept open by the clients,
+    # and their requests meet in the batcher.
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(_recv(self.request))
+            except ConnectionError:
+                return
+            batcher = self.server.batchers.get(request.get("model"))
+            if batcher is None:
+                _send(self.request, json.dumps({"error": f"model {request.get('model')!r} is not served here"}).encode())
+                continue
+            try:
+                vectors = np.ascontiguousarray(batcher.encode(request["texts"], normalize_embeddings=request.get("normalize", False)), dtype=np.float32)
+            except Exception as e:
+                _send(self.request, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode())
+                continue
+            _send(self.request, json.dumps({"shape": vectors.shape}).encode())
+            _send(self.request, vectors.tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128  # every worker thread of every bot may connect at once
+
+    def __init__(self, path, batchers):
+        if os.path.exists(path):
+            os.unlink(path)
+        self.batchers = batchers
+        super().__init__(path, _Handler)
+
+
+class EmbeddingClient:
+    # Drop-in for a SentenceTransformer backed by the socket service. Each
+    # thread keeps its own connection so concurrent callers are batched
+    # together on the server side; a forked child opens its own.
+    def __init__(self, path, model_name, timeout=CLIENT_TIMEOUT):
+        self.path = path
+        self.model_name = model_name
+        self.timeout = timeout
+        self._local = threading.local()
+        _clients.add(self)
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def _request(self, texts, normalize):
+        payload = json.dumps({"model": self.model_name, "texts": texts, "normalize": normalize}, ensure_ascii=False).encode()
+        sock = self._connection()
+        _send(sock, payload)
+        header = json.loads(_recv(sock))
+        if "error" in header:
+            raise RuntimeError(f"Embedding service error: {header['error']}")
+        return np.frombuffer(_recv(sock), dtype=np.float32).reshape(header["shape"])
+
+    def encode(self, sentences, normalize_embeddings=False, **kwargs):
+        texts = [sentences] if _single(sentences) else list(sentences)
+        try:
+            vectors = self._request(texts, bool(normalize_embeddings))
+        except (OSError, ConnectionError):
+            # The service may have restarted; reconnect once.
+            self._drop_connection()
+            vectors = self._request(texts, bool(normalize_embeddings))
+        return vectors[0] if _single(sentences) else vectors
+
+    def close(self):
+        self._drop_connection()
+
+
+def embedding_model(model_name, socket_path=SOCKET_PATH):
+    # What the bots use as `model`: the shared service when EMBEDDING_SOCKET
+    # is set, otherwise an in-process batcher over a lazily loaded model.
+    if socket_path:
+        return EmbeddingClient(socket_path, model_name)
+    return MicroBatcher(LazyModel(model_name, loader=load_model))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve micro-batched sentence embeddings on a Unix socket")
+    parser.add_argument("--model", action="append", required=True, help="model name; repeat to serve several")
+    parser.add_argument("--socket", default=SOCKET_PATH or "/tmp/embeddings.sock")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    batchers = {}
+    for name in args.model:
+        model = LazyModel(name, loader=load_model)
+        model.encode(["warm-up"], normalize_embeddings=True)
+        batchers[name] = MicroBatcher(model, args.max_batch_size, args.max_wait_ms)
+    server = EmbeddingServer(args.socket, batchers)
+    print(f"Serving {', '.join(batchers)} on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
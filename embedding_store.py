@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+import embedding_backend
+
+# On-disk store of encoded corpora (Greeting names, Barista questions). Each
+# store is a raw float32/float16 matrix opened with np.memmap plus a JSON
+# sidecar holding the texts (row order), the model name and a content hash of
+# model + backend + dtype + texts. The backend (embedding_backend.describe(),
+# e.g. "torch" or "onnx-int8 (avx2)") is part of it because the same model
+# gives slightly different vectors under ONNX or int8, so vectors are never
+# reused across a backend change. When the hash matches, a restart maps the file in
+# milliseconds and every worker process shares the same page-cache pages;
+# when it does not, rows for texts that are still present are copied from the
+# old file and only new texts are encoded.
+#
+# Matrix files are named after the content hash and never rewritten in
+# place, so a process that still maps an older version keeps reading it.
+
+STORE_DIR = os.environ.get("EMBEDDING_STORE_DIR", "embedding_store")
+STORE_DTYPE = os.environ.get("EMBEDDING_STORE_DTYPE", "float32")
+
+DTYPES = ("float32", "float16")
+
+
+def corpus_hash(model_name, backend, dtype, texts):
+    digest = hashlib.sha256()
+    digest.update(f"{model_name}\0{backend}\0{dtype}\0{len(texts)}\0".encode("utf-8"))
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, name, model_name, model, directory=STORE_DIR, dtype=STORE_DTYPE, backend=None):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported store dtype '{dtype}'")
+        self.name = name
+        self.model_name = model_name
+        self.model = model
+        self.backend = backend or embedding_backend.describe()
+        self.directory = directory
+        self.dtype = dtype
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.encoded = 0
+        self.reused = 0
+
+    @property
+    def encoder(self):
+        # What produced the vectors; saved next to anything built from them
+        # (e.g. knowlege's Barista index) to tell when they are stale.
+        return {"model": self.model_name, "backend": self.backend, "dtype": self.dtype}
+
+    @property
+    def sidecar_path(self):
+        return os.path.join(self.directory, f"{self.name}.json")
+
+    def _read_sidecar(self):
+        try:
+            with open(self.sidecar_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if any(meta.get(key) != value for key, value in self.encoder.items()):
+            return None
+        if not os.path.exists(os.path.join(self.directory, meta.get("file", ""))):
+            return None
+        return meta
+
+    def _open(self, meta):
+        if not meta["count"]:
+            return np.zeros((0, meta["dim"]), dtype=self.dtype)
+        return np.memmap(os.path.join(self.directory, meta["file"]), dtype=self.dtype, mode="r",
+                         shape=(meta["count"], meta["dim"]))
+
+    def load(self):
+        # (texts, matrix) from disk, or None when nothing usable is stored.
+        meta = self._read_sidecar()
+        if meta is None:
+            return None
+        return meta["texts"], self._open(meta)
+
+    def encode(self, texts):
+        # Matrix of normalized vectors for `texts`, in order, as a read-only
+        # memmap in the store dtype.
+        texts = list(texts)
+        digest = corpus_hash(self.model_name, self.backend, self.dtype, texts)
+        with self._lock:
+            meta = self._read_sidecar()
+            if meta is not None and meta["hash"] == digest:
+                self.loads += 1
+                return self._open(meta)
+
+            old_rows, old_matrix = {}, None
+            if meta is not None:
+                old_matrix = self._open(meta)
+                old_rows = {text: i for i, text in enumerate(meta["texts"])}
+            missing = list(dict.fromkeys(text for text in texts if text not in old_rows))
+            fresh = {}
+            if missing:
+                vectors = np.asarray(self.model.encode(missing, normalize_embeddings=True), dtype=np.float32)
+                fresh = dict(zip(missing, vectors))
+            self.encoded += len(missing)
+            self.reused += len(texts) - len(missing)
+
+            if texts:
+                matrix = np.vstack([
+                    fresh[text] if text in fresh else old_matrix[old_rows[text]]
+                    for text in texts
+                ]).astype(self.dtype)
+                dim = matrix.shape[1]
+            else:
+                matrix = None
+                dim = meta["dim"] if meta else 0
+            meta = self._write(texts, matrix, dim, digest, meta)
+            return self._open(meta)
+
+    def _write(self, texts, matrix, dim, digest, previous):
+        os.makedirs(self.directory, exist_ok=True)
+        file_name = f"{self.name}-{digest[:16]}.{'f16' if self.dtype == 'float16' else 'f32'}"
+        path = os.path.join(self.directory, file_name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            if matrix is not None:
+                f.write(np.ascontiguousarray(matrix).tobytes())
+        os.replace(tmp, path)
+
+        meta = {
+            **self.encoder,
+            "dim": dim,
+            "count": len(texts),
+            "hash": digest,
+            "file": file_name,
+            "texts": texts,
+        }
+        tmp = f"{self.sidecar_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, self.sidecar_path)
+
+        # Readers that mapped the old file keep their pages after the unlink.
+        if previous is not None and previous["file"] != file_name:
+            try:
+                os.remove(os.path.join(self.directory, previous["file"]))
+            except OSError:
+                pass
+        return meta
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "backend": self.backend,
+            "dtype": self.dtype,
+            "loads": self.loads,
+            "encoded": self.encoded,
+            "reused": self.reused,
+        }
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import threading
+import time
+
+import numpy as np
+
+import db
+
+# In-memory index of normalized Greeting embeddings. Built once at startup and
+# refreshed incrementally: every `refresh_interval` seconds the (name, reply)
+# rows are read and fingerprinted, and only when the fingerprint changed is
+# the index rebuilt, encoding just the names that are new. Greetings are
+# edited outside the bots, so the rows themselves are compared rather than a
+# count or timestamp that edits, renames and delete+add would not move.
+# Requests then only need to encode the incoming sentence. With an
+# EmbeddingStore the vectors also survive restarts. A failed poll is logged
+# and the current index keeps serving until the next one; only a forced
+# refresh (the startup build) raises.
+
+ROWS_QUERY = '''
+MATCH (n:Greeting)
+RETURN n.name AS name, n.msg_reply AS reply
+ORDER BY name
+'''
+
+
+def fingerprint(rows):
+    digest = hashlib.sha256()
+    for record in rows:
+        digest.update(json.dumps([record['name'], record['reply']], ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class GreetingIndex:
+    def __init__(self, model, refresh_interval=30.0, store=None):
+        self.model = model
+        self.store = store
+        self.refresh_interval = refresh_interval
+        # (names, matrix, replies), replaced as a whole
+        self._state = ([], None, {})
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def refresh(self, force=False):
+        # Returns True when the index was rebuilt.
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return False
+        with self._lock:
+            if not force and now - self._checked_at < self.refresh_interval:
+                return False
+            self._checked_at = now
+            try:
+                rows = db.read_query(ROWS_QUERY)
+                signature = fingerprint(rows)
+                if not force and signature == self._signature:
+                    return False
+                self._rebuild(rows)
+            except Exception as e:
+                if force:
+                    raise
+                print(f"Greeting index: refresh failed, keeping {len(self)} greetings: {e}")
+                return False
+            self._signature = signature
+            return True
+
+    def _rebuild(self, rows):
+        replies = {}
+        for record in rows:
+            if record['name'] is not None:
+                replies.setdefault(record['name'], record['reply'])
+        names = list(replies)
+
+        if self.store is not None:
+            # Vectors come from the on-disk store, which encodes only names
+            # it has not seen; float16 stores are widened once here.
+            matrix = self.store.encode(names) if names else None
+            if matrix is not None and matrix.dtype != np.float32:
+                matrix = matrix.astype(np.float32)
+            self._state = (names, matrix, replies)
+            return
+
+        # Reuse the vectors we already have, encode only the new names.
+        old_names, old_matrix, _ = self._state
+        known = {name: i for i, name in enumerate(old_names)}
+        missing = [name for name in names if name not in known]
+        fresh = {}
+        if missing:
+            vectors = self.model.encode(missing, normalize_embeddings=True)
+            fresh = dict(zip(missing, vectors))
+        if names:
+            matrix = np.vstack([
+                fresh[name] if name in fresh else old_matrix[known[name]]
+                for name in names
+            ]).astype(np.float32)
+        else:
+            matrix = None
+        # Swap in one go so concurrent readers never see a half-built index.
+        self._state = (names, matrix, replies)
+
+    def search(self, vec):
+        self.refresh()
+        return self._search(self._state, vec)
+
+    def _search(self, state, vec):
+        names, matrix, _ = state
+        if matrix is None:
+            return None, 0.0
+        scores = matrix @ np.asarray(vec, dtype=np.float32)
+        best = int(np.argmax(scores))
+        return names[best], float(scores[best])
+
+    def exact(self, text):
+        # Reply for a message that is exactly a greeting name, without encoding it.
+        self.refresh()
+        return self._state[2].get(text)
+
+    def match(self, vec, threshold=0.8):
+        self.refresh()
+        state = self._state
+        name, score = self._search(state, vec)
+        if name is not None and score > threshold:
+            return state[2].get(name)
+        return None
@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+
+# Registry of canned intents, each described by a few anchor phrases. All
+# phrases are encoded once into a single matrix, so scoring a query against
+# every intent is one matrix multiply no matter how many intents exist.
+
+
+class IntentRegistry:
+    def __init__(self, model):
+        self.model = model
+        self._phrases = {}
+        self._names = []
+        self._offsets = np.zeros(0, dtype=np.intp)
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self._phrases
+
+    def register(self, name, phrases):
+        phrases = list(phrases)
+        if not phrases:
+            raise ValueError(f"Intent '{name}' needs at least one phrase")
+        vectors = np.asarray(self.model.encode(phrases, normalize_embeddings=True), dtype=np.float32)
+        with self._lock:
+            self._phrases[name] = vectors
+            self._rebuild()
+
+    def unregister(self, name):
+        with self._lock:
+            if self._phrases.pop(name, None) is not None:
+                self._rebuild()
+
+    def _rebuild(self):
+        # Phrases of one intent sit in a contiguous block of rows; `offsets`
+        # marks where each block starts so np.maximum.reduceat can take the
+        # best phrase per intent.
+        names = list(self._phrases)
+        if names:
+            blocks = [self._phrases[name] for name in names]
+            offsets = np.cumsum([0] + [len(block) for block in blocks[:-1]])
+            matrix = np.vstack(blocks)
+        else:
+            offsets, matrix = np.zeros(0, dtype=np.intp), None
+        self._names, self._offsets, self._matrix = names, offsets, matrix
+
+    def scores(self, vec):
+        names, offsets, matrix = self._names, self._offsets, self._matrix
+        if matrix is None:
+            return {}
+        phrase_scores = matrix @ np.asarray(vec, dtype=np.float32)
+        best = np.maximum.reduceat(phrase_scores, offsets)
+        return dict(zip(names, best.tolist()))
+
+    def match(self, vec, threshold=None):
+        # Returns (intent, score) for the best intent, or (None, score) when
+        # nothing clears the threshold.
+        scores = self.scores(vec)
+        if not scores:
+            return None, 0.0
+        name = max(scores, key=scores.get)
+        score = scores[name]
+        if threshold is not None and score <= threshold:
+            return None, score
+        return name, score
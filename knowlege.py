@@ -1,153 +1,239 @@
-from neo4j import GraphDatabase
-from flask import Flask, request
-from linebot import LineBotApi, WebhookHandler
+from flask import Flask, request, jsonify
+from linebot import WebhookHandler
 from linebot.models import TextSendMessage
-from sentence_transformers import SentenceTransformer, util
-import numpy as np
-import requests
 import json
-model = SentenceTransformer('sentence-transformers/xlm-r-bert-base-nli-stsb-mean-tokens')
+import os
+
+import db
+from schema import ensure_schema
+from startup import Warmup
+from embedding_service import embedding_model
+from embedding_cache import encode_cached, encode_many_cached
+from dispatcher import EventDispatcher
+from ollama_client import ollama
+from conversation import ConversationStore
+from write_behind import journal
+from vector_index import create_index, load_index
+from embedding_store import EmbeddingStore
+from webhook_worker import EventWorker
+from line_client import TimedLineBotApi
+import metrics
+MODEL_NAME = 'sentence-transformers/xlm-r-bert-base-nli-stsb-mean-tokens'
+# Micro-batched; the shared service when EMBEDDING_SOCKET is set, otherwise
+# loaded in-process by the warm-up below
+model = embedding_model(MODEL_NAME)
 URI = "bolt://localhost:7687"
 AUTH = ("neo4j", "test")
 
-conversation_history = []
+# Per-user history, bounded by turns and by an estimated token budget
+conversations = ConversationStore()
 
-def get_llama_response(prompt):
-   OLLAMA_API_URL = "http://localhost:11434/api/generate"
-   headers = {
-      "Content-Type": "application/json"
-   }
+def get_llama_response(prompt, uid=None):
    role_prompt = f"""
-   ผู้ตอบชื่อจอร์นมีความชำนาญเรื่องการชงกาแฟ {prompt} + {conversation_history} 
+   ผู้ตอบชื่อจอร์นมีความชำนาญเรื่องการชงกาแฟ {prompt} + {conversations.history(uid)} 
    โดยคำตอบยาวไม่เกิน 20 คำ 
    """
-   payload = {
-      "model": "supachai/llama-3-typhoon-v1.5",
-      "prompt": role_prompt,
-      "stream": False
-   }
+   generation = ollama.generate(role_prompt, model="supachai/llama-3-typhoon-v1.5")
    
-   response = requests.post(OLLAMA_API_URL, headers=headers, data=json.dumps(payload))
-   
-   if response.status_code == 200:
-      response_data = response.text
-      data = json.loads(response_data)
-      return data.get("response", "ขอโทษด้วย ฉันไม่สามารถให้คำตอบนี้ได้")  # Default message if response not found
+   if generation.ok:
+      return generation.text or "ขอโทษด้วย ฉันไม่สามารถให้คำตอบนี้ได้"  # Default message if response not found
    else:
-      print(f"Failed to get a response: {response.status_code}, {response.text}")
+      print(f"Failed to get a response: {generation.status_code}, {generation.error}")
       return "ขอโทษด้วย ฉันไม่สามารถให้คำตอบนี้ได้"
 
 
-def run_query(query, parameters=None):
-   with GraphDatabase.driver(URI, auth=AUTH) as driver:
-       driver.verify_connectivity()
-       with driver.session() as session:
-           result = session.run(query, parameters)
-           return [record for record in result]
-   driver.close()
+db.configure(URI, AUTH)
 
 
 cypher_query = '''
 MATCH (n:Barista) RETURN n.question as question, n.msg_reply as reply;
 '''
-greeting_corpus = []
-greeting_vec = None
-results = run_query(cypher_query)
-for record in results:
-   greeting_corpus.append(record['question'])
-greeting_corpus = list(set(greeting_corpus))
-print(greeting_corpus)  
+barista_replies = {}
+
+# Barista questions live in a vector index over the store's memmap, so
+# workers share its pages and only questions added at runtime (LLM
+# fallbacks) are held in memory. The saved index keeps its ids and IVF
+# buckets, not the vectors; it is rebuilt when the questions changed.
+BARISTA_INDEX_KIND = os.environ.get("BARISTA_INDEX_KIND", "ivf")
+BARISTA_INDEX_PATH = os.environ.get("BARISTA_INDEX_PATH", "barista_index.npz")
+barista_index = None
+# Encoded questions, kept on disk; only new or changed questions are encoded
+barista_store = EmbeddingStore("barista", MODEL_NAME, model)
+
+def load_barista_index():
+   global barista_index
+   greeting_corpus = []
+   results = db.read_query(cypher_query)
+   for record in results:
+      if record['question'] is not None:
+         greeting_corpus.append(record['question'])
+         barista_replies.setdefault(record['question'], record['reply'])
+   greeting_corpus = sorted(set(greeting_corpus))  # stable order keeps the store hash stable
+
+   vectors = barista_store.encode(greeting_corpus)
+   index = None
+   if os.path.exists(BARISTA_INDEX_PATH):
+      try:
+         index = load_index(BARISTA_INDEX_PATH, base_ids=greeting_corpus, base=vectors)
+      except ValueError as e:
+         print(f"Barista index: {e}, rebuilding")
+      else:
+         if index.meta.get("encoder") != barista_store.encoder:
+            print(f"Barista index: {BARISTA_INDEX_PATH} was built by {index.meta.get('encoder')}, rebuilding")
+            index = None
+   if index is None:
+      index = create_index(BARISTA_INDEX_KIND)
+      index.meta["encoder"] = barista_store.encoder
+      index.set_base(greeting_corpus, vectors)
+      index.save(BARISTA_INDEX_PATH)
+   barista_index = index
+   print(f"Barista index: {len(barista_index)} questions ({barista_index.kind})")
 
 def compute_similar(corpus, sentence):
-   a_vec = model.encode([corpus],convert_to_tensor=True,normalize_embeddings=True)
-   b_vec = model.encode([sentence],convert_to_tensor=True,normalize_embeddings=True)
+   from sentence_transformers import util
+   a_vec = encode_cached(model, MODEL_NAME, corpus)
+   b_vec = encode_cached(model, MODEL_NAME, sentence)
    similarities = util.cos_sim(a_vec, b_vec)
    return similarities
 
 
-def neo4j_search(neo_query):
-   results = run_query(neo_query)
+def neo4j_search(neo_query, parameters=None):
+   results = db.read_query(neo_query, parameters)
+   response_msg = None
    # Print results
    for record in results:
        response_msg = record['reply']
    return response_msg     
 
 def create_barista_node(question, reply):
-    create_query = f'''
-    CREATE (:Barista {{question: '{question}', msg_reply: '{reply}'}})
-    '''
-    run_query(create_query)
+    # Queued for the write-behind journal; kept in barista_replies meanwhile
+    barista_replies.setdefault(question, reply)
+    journal.submit("barista", {'question': question, 'reply': reply})
 
-def compute_response(sentence):
+def compute_response(sentence, uid=None):
    
-   greeting_vec = model.encode(greeting_corpus, convert_to_tensor=True,normalize_embeddings=True)
-   ask_vec = model.encode(sentence, convert_to_tensor=True,normalize_embeddings=True)
-   greeting_scores = util.cos_sim(greeting_vec, ask_vec) 
-   greeting_score = greeting_scores.cpu()
-   greeting_np = greeting_score.numpy()
-   max_greeting_score = np.argmax(greeting_np)
-   Match_Question = greeting_corpus[max_greeting_score] 
-   conversation_history.append(f"user:{sentence}")
-   if greeting_np[np.argmax(greeting_np)] > 0.8 :
-        My_cypher = f"MATCH (n:Barista) where n.question ='{Match_Question}' RETURN n.msg_reply as reply"
-        my_msg  = neo4j_search(My_cypher)
+   with metrics.span("encode"):
+      ask_vec = encode_cached(model, MODEL_NAME, sentence)
+   with metrics.span("barista_match"):
+      hits = barista_index.search(ask_vec, k=1)
+   conversations.append(uid, "user", sentence)
+   if hits and hits[0][1] > 0.8 :
+        metrics.count_path("barista")
+        Match_Question = hits[0][0]
+        my_msg = barista_replies.get(Match_Question)
+        if my_msg is None:
+            My_cypher = "MATCH (n:Barista) where n.question = $question RETURN n.msg_reply as reply"
+            my_msg  = neo4j_search(My_cypher, {'question': Match_Question})
    else:
-        my_msg = get_llama_response(sentence)  
+        metrics.count_path("llm_fallback")
+        my_msg = get_llama_response(sentence, uid)  
         create_barista_node(sentence,my_msg)
+        barista_index.add([sentence], [ask_vec])
         my_msg += "\ncreate by ollama"
-   conversation_history.append(f"bot:{my_msg}")
+   conversations.append(uid, "bot", my_msg)
    print(my_msg)
    return my_msg   
-app = Flask(_name_)
+app = Flask(__name__)
 
 def save_user_uid(uid):
-    # Cypher query to create a new User node if it doesn't already exist
-    query = '''
-    MERGE (u:User {uid: $uid})
-    '''
-    parameters = {'uid': uid}
-    run_query(query, parameters)
+    # Queued; the write-behind journal MERGEs the User node in a batch
+    journal.submit("user", {'uid': uid})
+
+def save_user_uids(uids):
+    for uid in set(uids):
+        if uid:
+            journal.submit("user", {'uid': uid})
 
 def save_response(uid, answer_text, response_msg):
-    # Cypher query to match User and create Answer and Response nodes with relationships
-    query = '''
-    MATCH (u:User {uid: $uid})
-    CREATE (a:Answer {text: $answer_text})
-    CREATE (r:Response {text: $response_msg})
-    CREATE (u)-[:useranswer]->(a)
-    CREATE (a)-[:response]->(r)
-    '''
-    parameters = {
-        'uid': uid,
-        'answer_text': answer_text,
-        'response_msg': response_msg
-    }
-    run_query(query, parameters)
+    # Queued; creates the Answer and Response nodes for the user in a batch
+    journal.submit("response", {'uid': uid, 'answer_text': answer_text, 'response_msg': response_msg})
+
+
+access_token = os.environ.get("LINE_CHANNEL_ACCESS_TOKEN") or 'Nh8mjNfdPX4G9D5DR3a6vuCWy/tZ8qql7NNocTnTreCMktobm+ju5Y/5UaFbx+nFyJeKTRm9twYWQOxNgVG5mpEr9EtqLc0YZMCj9MyFMymaSe+fhvMiUe4efdcRrE8XYCr9kbDN0VGzLHcsH1WT0gdB04t89/1O/w1cDnyilFU='
+secret = os.environ.get("LINE_CHANNEL_SECRET") or '0101124cb552df552fb5c81e8dbe76e7'
+
+# Built once: the client keeps its connections to the LINE API open
+line_bot_api = TimedLineBotApi(access_token)
+
+# Set ASYNC_WEBHOOK=1 to answer LINE at once and process events in the background
+ASYNC_WEBHOOK = os.environ.get("ASYNC_WEBHOOK") == "1"
+
+dispatcher = EventDispatcher()
+
+@dispatcher.on("follow")
+def handle_follow(event):
+   save_user_uid(event['source']['userId'])
+
+@dispatcher.on_text
+def handle_text_events(events):
+   msgs = [event['message']['text'] for event in events]
+   uids = [event['source'].get('userId') for event in events]
+   # One write and one encode call for the whole batch
+   save_user_uids(uids)
+   encode_many_cached(model, MODEL_NAME, msgs)
+   for event, msg, uid in zip(events, msgs, uids):
+       try:
+           tk = event['replyToken']
+           response_msg = compute_response(msg, uid)
+           save_response(uid, msg, response_msg)
 
+           line_bot_api.reply_message( tk, TextSendMessage(text=response_msg) )
+           print(msg, tk)                                     
+       except Exception as e:
+           print("Error:", e)
+           print(event)
+
+# Start-up work, run in the background; /readyz turns 200 once it is done
+warmup = Warmup()
+
+@warmup.step
+def load_model():
+   # One dummy encode so the first user does not pay for lazy allocations
+   model.encode(["warm-up"], normalize_embeddings=True)
+
+@warmup.step
+def connect_db():
+   db.verify_connectivity()
+   ensure_schema()
+
+warmup.step(load_barista_index)
+
+warmup.register_routes(app)
+metrics.register_routes(app)
+warmup.start()
+
+def handle_events(json_data):
+   with metrics.trace("webhook"):
+      dispatcher.dispatch(json_data)
+
+event_worker = EventWorker(handle_events)
+if ASYNC_WEBHOOK:
+   event_worker.start()
 
 @app.route("/", methods=['POST'])
 def linebot():
+   if not warmup.ready:
+       return 'Starting', 503
+
    body = request.get_data(as_text=True)                   
    
    try:
        json_data = json.loads(body)                       
-       access_token = 'Nh8mjNfdPX4G9D5DR3a6vuCWy/tZ8qql7NNocTnTreCMktobm+ju5Y/5UaFbx+nFyJeKTRm9twYWQOxNgVG5mpEr9EtqLc0YZMCj9MyFMymaSe+fhvMiUe4efdcRrE8XYCr9kbDN0VGzLHcsH1WT0gdB04t89/1O/w1cDnyilFU='
-       secret = '0101124cb552df552fb5c81e8dbe76e7'
-       line_bot_api = LineBotApi(access_token)             
        handler = WebhookHandler(secret)                   
        signature = request.headers['X-Line-Signature']     
        handler.handle(body, signature)                     
-       msg = json_data['events'][0]['message']['text']     
-       tk = json_data['events'][0]['replyToken']  
-       uid = json_data['events'][0]['source']['userId']
-       save_user_uid(uid)
-       response_msg = compute_response(msg)
-       save_response(uid, msg, response_msg)
-
-       line_bot_api.reply_message( tk, TextSendMessage(text=response_msg) )
-       print(msg, tk)                                     
+       if not ASYNC_WEBHOOK:
+           handle_events(json_data)
+       elif not event_worker.submit(json_data):
+           # Queue is full: refuse so LINE retries later instead of piling up work
+           return 'Busy', 503
    except:
        print(body)                                         
    return 'OK'               
-if _name_ == '_main_':
+
+@app.route("/queue", methods=['GET'])
+def queue_stats():
+   return jsonify(event_worker.stats())
+
+if __name__ == '__main__':
    app.run(port=5000)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import json
+import os
+import weakref
+
+import requests
+from linebot import LineBotApi
+from linebot.exceptions import InvalidSignatureError
+from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
+from linebot.webhook import SignatureValidator
+
+import metrics
+
+# LINE Messaging API client used by the bots; reply_message is timed as the
+# "line.reply" stage. LINE_API_ENDPOINT points the bots at another API host,
+# e.g. the mock server used for load tests.
+#
+# The client is meant to be built once per process: its HTTP session keeps
+# connections to the API open (LINE_POOL_SIZE per host) instead of a new
+# TLS handshake for every reply.
+
+API_ENDPOINT = os.environ.get("LINE_API_ENDPOINT", LineBotApi.DEFAULT_API_ENDPOINT)
+POOL_SIZE = int(os.environ.get("LINE_POOL_SIZE", "16"))
+
+# The reply API accepts at most this many messages per call, and a reply
+# token can be used only once.
+MAX_REPLY_MESSAGES = 5
+
+
+# Clients alive in this process; a forked child (WEBHOOK_WORKER_KIND=process)
+# gets new sessions instead of sharing the parent's open connections.
+_clients = weakref.WeakSet()
+
+
+class PooledHttpClient(RequestsHttpClient):
+    def __init__(self, timeout=RequestsHttpClient.DEFAULT_TIMEOUT, pool_size=POOL_SIZE):
+        super().__init__(timeout)
+        self.pool_size = pool_size
+        self._reset()
+        _clients.add(self)
+
+    def _reset(self):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        response = self.session.get(url, headers=headers, params=params, stream=stream,
+                                    timeout=self.timeout if timeout is None else timeout)
+        return RequestsHttpResponse(response)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        response = self.session.post(url, headers=headers, data=data,
+                                     timeout=self.timeout if timeout is None else timeout)
+        return RequestsHttpResponse(response)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        response = self.session.delete(url, headers=headers, data=data,
+                                       timeout=self.timeout if timeout is None else timeout)
+        return RequestsHttpResponse(response)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        response = self.session.put(url, headers=headers, data=data,
+                                    timeout=self.timeout if timeout is None else timeout)
+        return RequestsHttpResponse(response)
+
+
+def _reset_after_fork():
+    for client in list(_clients):
+        client._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class TimedLineBotApi(LineBotApi):
+    def __init__(self, channel_access_token, endpoint=API_ENDPOINT, http_client=PooledHttpClient, **kwargs):
+        super().__init__(channel_access_token, endpoint=endpoint, http_client=http_client, **kwargs)
+
+    def reply_message(self, reply_token, messages, *args, **kwargs):
+        with metrics.span("line.reply"):
+            return super().reply_message(reply_token, messages, *args, **kwargs)
+
+
+class ReplyCollector:
+    # Stands in for the API client while events are handled: reply_message
+    # only collects, and flush(reply_token) sends that token's messages in
+    # one call. Flush each event as soon as it is done so it does not wait
+    # for slower events in the same delivery; used as a context manager,
+    # whatever is left goes out at the end.
+    def __init__(self, line_bot_api):
+        self.line_bot_api = line_bot_api
+        self._replies = {}
+
+    def reply_message(self, reply_token, messages, *args, **kwargs):
+        if not isinstance(messages, (list, tuple)):
+            messages = [messages]
+        self._replies.setdefault(reply_token, []).extend(messages)
+
+    def flush(self, reply_token=None):
+        if reply_token is None:
+            replies, self._replies = self._replies, {}
+        else:
+            messages = self._replies.pop(reply_token, None)
+            replies = {reply_token: messages} if messages else {}
+        for reply_token, messages in replies.items():
+            if len(messages) > MAX_REPLY_MESSAGES:
+                print(f"Reply has {len(messages)} messages, sending the first {MAX_REPLY_MESSAGES}")
+            try:
+                self.line_bot_api.reply_message(reply_token, messages[:MAX_REPLY_MESSAGES])
+            except Exception as e:
+                print("Error:", e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+
+
+class WebhookReader:
+    # Checks X-Line-Signature and decodes the body in one pass. Events stay
+    # plain dicts, which is what EventDispatcher routes.
+    def __init__(self, channel_secret):
+        self.validator = SignatureValidator(channel_secret)
+
+    def parse(self, body, signature):
+        if not self.validator.validate(body, signature):
+            raise InvalidSignatureError('Invalid signature. signature=' + signature)
+        return json.loads(body)
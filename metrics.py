@@ -0,0 +1,225 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-stage latency for the bots. Code times a stage with span("name") (or
+# reports a duration it already measured with observe()); each stage feeds a
+# histogram, and the branch a message took is counted with count_path().
+# trace() wraps one webhook: its spans are collected per thread and, when the
+# whole webhook is slower than METRICS_SLOW_SECONDS, the breakdown is printed
+# so a slow reply shows which stage it spent its time in.
+#
+# Everything is served in the Prometheus text format on /metrics. Recording
+# is a perf_counter pair, a bisect and a locked increment, cheap enough to
+# leave on in production; METRICS_ENABLED=0 turns it off entirely.
+
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+SLOW_SECONDS = float(os.environ.get("METRICS_SLOW_SECONDS", "3"))
+PREFIX = "chatbot"
+
+# Seconds; from sub-millisecond cache hits to minute-long LLM calls.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum.
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labels, label_values, [le])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, label_values)} {total}"
+            yield f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}"
+
+
+class Callback:
+    # Values read at scrape time from read() -> {label values: value}, for
+    # numbers a component already keeps (e.g. a cache's stats()).
+    def __init__(self, name, help_text, kind, labels, read):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.read = read
+
+    def collect(self):
+        for label_values, value in sorted(self.read().items()):
+            yield f"{self.name}{_labels(self.labels, label_values)} {value}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+stage_seconds = registry.register(Histogram(f"{PREFIX}_stage_seconds", "Time spent per stage", ["stage"]))
+stage_errors = registry.register(Counter(f"{PREFIX}_stage_errors_total", "Stages that raised", ["stage"]))
+paths = registry.register(Counter(f"{PREFIX}_path_total", "Messages per handling path", ["path"]))
+traces = registry.register(Histogram(f"{PREFIX}_webhook_seconds", "End-to-end time per webhook", ["name"]))
+slow_traces = registry.register(Counter(f"{PREFIX}_webhook_slow_total", "Webhooks slower than METRICS_SLOW_SECONDS", ["name"]))
+
+# Caches registered with watch_cache(), reported from their stats().
+_caches = {}
+
+
+def _cache_stat(key):
+    def read():
+        values = {}
+        for name, cache in list(_caches.items()):
+            stats = cache.stats()
+            if key in stats:
+                values[(name,)] = stats[key]
+        return values
+    return read
+
+
+cache_hits = registry.register(Callback(f"{PREFIX}_cache_hits_total", "Cache hits", "counter", ["cache"], _cache_stat("hits")))
+cache_misses = registry.register(Callback(f"{PREFIX}_cache_misses_total", "Cache misses", "counter", ["cache"], _cache_stat("misses")))
+cache_hit_ratio = registry.register(Callback(f"{PREFIX}_cache_hit_ratio", "Cache hits / lookups", "gauge", ["cache"], _cache_stat("hit_rate")))
+cache_size = registry.register(Callback(f"{PREFIX}_cache_entries", "Entries held by the cache", "gauge", ["cache"], _cache_stat("size")))
+
+_local = threading.local()
+
+
+def observe(stage, seconds):
+    if not ENABLED:
+        return
+    stage_seconds.observe(seconds, stage)
+    spans = getattr(_local, "spans", None)
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def timed(stage):
+    # Decorator form of span().
+    def wrap(fn):
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        return wrapper
+    return wrap
+
+
+def watch_cache(name, cache):
+    # Export a cache's stats() (hits, misses, hit_rate, size) on /metrics.
+    _caches[name] = cache
+    return cache
+
+
+def count_path(path):
+    if ENABLED:
+        paths.inc(path)
+
+
+@contextmanager
+def trace(name="webhook"):
+    if not ENABLED or getattr(_local, "spans", None) is not None:
+        # Disabled, or nested inside another trace: the outer one reports.
+        yield
+        return
+    _local.spans = []
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        total = time.perf_counter() - started
+        spans, _local.spans = _local.spans, None
+        traces.observe(total, name)
+        if total > SLOW_SECONDS:
+            slow_traces.inc(name)
+            breakdown = ", ".join(f"{stage}={seconds * 1000:.0f}ms" for stage, seconds in spans)
+            print(f"Slow {name}: {total * 1000:.0f}ms [{breakdown}]")
+
+
+def register_routes(app):
+    from flask import Response
+
+    @app.route("/metrics", methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -1,237 +1,352 @@
-from neo4j import GraphDatabase
 from flask import Flask, request, jsonify
-from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import (
     MessageEvent, TextMessage, TextSendMessage,
     PostbackTemplateAction
 )
-from sentence_transformers import SentenceTransformer, util
-import numpy as np
-import requests
-import json
-from selenium import webdriver
+import os
 from selenium.webdriver.common.by import By
-from bs4 import BeautifulSoup
-import chromedriver_autoinstaller
 
-# Setup Chrome options for Selenium
-chrome_options = webdriver.ChromeOptions()
-chrome_options.add_argument('--headless')
-chrome_options.add_argument('--no-sandbox')
-chrome_options.add_argument('--disable-dev-shm-usage')
+import db
+from schema import ensure_schema
+from startup import Warmup
+from embedding_service import embedding_model
+from embedding_cache import encode_cached, encode_many_cached
+from dispatcher import EventDispatcher
+from greeting_index import GreetingIndex
+from embedding_store import EmbeddingStore
+from intents import IntentRegistry
+from webhook_worker import EventWorker
+from ollama_client import ollama
+from answer_cache import SemanticAnswerCache
+from write_behind import journal, timestamp
+from profile_cache import ProfileCache
+from thai_text import PreRouter
+from line_client import TimedLineBotApi, ReplyCollector, WebhookReader
+import metrics
+from browser_pool import browser_pool
+import youtube_search
+from search_cache import SearchCache
 
-# Install ChromeDriver automatically
-chromedriver_autoinstaller.install()
-
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
-headers = {
-    "Content-Type": "application/json"
-}
-
-model = SentenceTransformer('sentence-transformers/distiluse-base-multilingual-cased-v2')
+MODEL_NAME = 'sentence-transformers/distiluse-base-multilingual-cased-v2'
+# Micro-batched; the shared service when EMBEDDING_SOCKET is set, otherwise
+# loaded in-process by the warm-up below
+model = embedding_model(MODEL_NAME)
 
 URI = "neo4j://localhost:7999"
 AUTH = ("neo4j", "password")
 
-def run_query(query, parameters=None):
-    with GraphDatabase.driver(URI, auth=AUTH) as driver:
-        driver.verify_connectivity()
-        with driver.session() as session:
-            result = session.run(query, parameters)
-            return [record for record in result]
+# Set ASYNC_WEBHOOK=1 to answer LINE at once and process events in the background
+ASYNC_WEBHOOK = os.environ.get("ASYNC_WEBHOOK") == "1"
+
+db.configure(URI, AUTH)
+
+# Greeting vectors are kept on disk and only new names are encoded
+greeting_index = GreetingIndex(model, store=EmbeddingStore("greeting", MODEL_NAME, model))
+intent_registry = IntentRegistry(model)
+
+# Per user: the prompt carries the asker's name, so an answer may too
+answer_cache = metrics.watch_cache("answer", SemanticAnswerCache(scope="user"))
+
+# Keyword rules checked before any embedding
+pre_router = PreRouter(keywords={"ค้นหา": "search"}, rules=[("search", {"search"})])
 
 def save_user_info(uid, name):
     query = '''
     MERGE (u:User {uid: $uid})
     SET u.name = $name
     '''
-    run_query(query, parameters={'uid': uid, 'name': name})
+    db.write_query(query, parameters={'uid': uid, 'name': name})
+    profile_cache.put(uid, name)
 
-def get_user_name(uid):
+def load_user_names(uids):
     query = '''
-    MATCH (u:User {uid: $uid})
-    RETURN u.name AS name
+    UNWIND $uids AS uid
+    MATCH (u:User {uid: uid})
+    RETURN u.uid AS uid, u.name AS name
     '''
-    result = run_query(query, parameters={'uid': uid})
-    return result[0]['name'] if result else None
+    result = db.read_query(query, parameters={'uids': list(set(uids))})
+    return {record['uid']: record['name'] for record in result}
+
+# Names rarely change, so they are read through a cache
+profile_cache = ProfileCache(load_user_names)
+
+def get_user_name(uid):
+    return profile_cache.get(uid)
+
+def get_user_names(uids):
+    return profile_cache.get_many(uids)
+
+def save_user_uid(uid):
+    journal.submit("user", {'uid': uid})
+    profile_cache.add(uid)
 
 def log_chat_history(uid, message, reply):
-    query = '''
-    MATCH (u:User {uid: $uid})
-    CREATE (c:Chat {message: $message, reply: $reply, timestamp: timestamp()})
-    CREATE (u)-[:SENT]->(c)
-    '''
-    run_query(query, parameters={'uid': uid, 'message': message, 'reply': reply})
+    # Queued; written in a batch by the write-behind journal
+    journal.submit("chat", {'uid': uid, 'message': message, 'reply': reply, 'timestamp': timestamp()})
 
 def save_response(uid, answer_text, response_msg):
-    query = '''
-    MATCH (u:User {uid: $uid})
-    CREATE (a:Answer {text: $answer_text})
-    CREATE (r:Response {text: $response_msg})
-    CREATE (u)-[:useranswer]->(a)
-    CREATE (a)-[:response]->(r)
-    '''
-    parameters = {
-        'uid': uid,
-        'answer_text': answer_text,
-        'response_msg': response_msg
-    }
-    run_query(query, parameters)
+    journal.submit("response", {'uid': uid, 'answer_text': answer_text, 'response_msg': response_msg})
 
 def compute_response(sentence):
-    greeting_corpus = list(set(record['name'] for record in run_query('MATCH (n:Greeting) RETURN n.name as name;')))
-    greeting_vec = model.encode(greeting_corpus, convert_to_tensor=True, normalize_embeddings=True)
-    ask_vec = model.encode(sentence, convert_to_tensor=True, normalize_embeddings=True)
-    greeting_scores = util.cos_sim(greeting_vec, ask_vec)
-    
-    max_greeting_score_index = np.argmax(greeting_scores.cpu().numpy())
-    if greeting_scores[max_greeting_score_index] > 0.8:
-        match_greeting = greeting_corpus[max_greeting_score_index]
-        my_cypher = f"MATCH (n:Greeting) WHERE n.name = '{match_greeting}' RETURN n.msg_reply AS reply"
-        results = run_query(my_cypher)
-        return results[0]['reply'] if results else None
-    return None
+    ask_vec = encode_cached(model, MODEL_NAME, sentence)
+    with metrics.span("greeting_match"):
+        return greeting_index.match(ask_vec, threshold=0.8)
+
+# Top-result cache: repeated and concurrent searches for the same song
+# share one scrape
+search_cache = SearchCache(namespace="top1")
 
 # YouTube scraping function
 def youtube_scrape(search_query):
+    return search_cache.get_or_fetch(search_query, youtube_scrape_uncached)
+
+def youtube_scrape_uncached(search_query):
+    # Plain HTTP + ytInitialData first; the browser only when that fails
+    return youtube_search.search(search_query, limit=1, fallback=youtube_scrape_browser)
+
+def youtube_scrape_browser(search_query):
     url = "https://www.youtube.com/results"
     
-    # Set up the WebDriver
-    driver = webdriver.Chrome(options=chrome_options)
-    
     try:
-        driver.get(url)
-        search_box = driver.find_element(By.NAME, "search_query")
-        search_box.send_keys(search_query)
-        search_box.submit()
-
-        driver.implicitly_wait(10)  # Wait for the page to load
-
-        # Parse the page with BeautifulSoup
-        html = driver.page_source
-        soup = BeautifulSoup(html, "html.parser")
-
-        # Extract search results
-        results = []
-        title_elements = soup.find_all('a', id='video-title', limit=1)  
-        for title_element in title_elements:
-            title = title_element.get_text().strip()
-            link = f"https://www.youtube.com{title_element['href']}"
-            results.append({
-                'title': title,
-                'link': link
-            })
-
-        return results
+        # Borrow a warm driver from the shared pool
+        with browser_pool.driver() as driver:
+            driver.get(url)
+            search_box = driver.find_element(By.NAME, "search_query")
+            search_box.send_keys(search_query)
+            search_box.submit()
+
+            driver.implicitly_wait(10)  # Wait for the page to load
+
+            html = driver.page_source
+
+        # Parse the page with BeautifulSoup and extract search results
+        return youtube_search.parse_rendered_html(html, limit=1)
 
     except Exception as e:
         return None
-    
-    finally:
-        driver.quit()  # Ensure driver is closed properly
 
 def check_previous_question(question):
     cypher_query = '''
     MATCH (q:Question {text: $question})-[:HAS_ANSWER]->(a:Answer)
     RETURN a.text AS answer
     '''
-    result = run_query(cypher_query, parameters={"question": question})
+    result = db.read_query(cypher_query, parameters={"question": question})
     return result[0]['answer'] if result else None
 
-def is_similar_query(user_query, expected_queries):
-    user_vec = model.encode(user_query, convert_to_tensor=True, normalize_embeddings=True)
-    for expected in expected_queries:
-        expected_vec = model.encode(expected, convert_to_tensor=True, normalize_embeddings=True)
-        score = util.cos_sim(user_vec, expected_vec)
-        if score > 0.7:  # Adjust threshold as needed
-            return True
-    return False
+def check_previous_questions(questions):
+    cypher_query = '''
+    UNWIND $questions AS question
+    MATCH (q:Question {text: question})-[:HAS_ANSWER]->(a:Answer)
+    RETURN question, a.text AS answer
+    '''
+    result = db.read_query(cypher_query, parameters={"questions": list(set(questions))})
+    answers = {}
+    for record in result:
+        answers.setdefault(record['question'], record['answer'])
+    return answers
 
-def remove_endings(text):
-    endings = ["ครับ", "ค่ะ", "น้ะ", "นะ", "นะจ้ะ"]
-    for ending in endings:
-        text = text.replace(ending, "")
-    return text.strip()
+def is_similar_query(user_query, intent, threshold=0.7):
+    user_vec = encode_cached(model, MODEL_NAME, user_query)
+    return intent_registry.scores(user_vec).get(intent, 0.0) > threshold  # Adjust threshold as needed
 
 app = Flask(__name__)
 
-with open('/Users/sittasahathum/Desktop/social/venv/username_line.txt', 'r') as file:
+# Token on the first line, channel secret on the second
+LINE_CREDENTIALS = os.environ.get("LINE_CREDENTIALS_FILE", '/Users/sittasahathum/Desktop/social/venv/username_line.txt')
+with open(LINE_CREDENTIALS, 'r') as file:
     lines = file.readlines()
     channel_access_token = lines[0].strip()  
     channel_secret = lines[1].strip()          
 
+# Built once: the client keeps its connections to the LINE API open
+line_bot_api = TimedLineBotApi(channel_access_token)
+webhook_reader = WebhookReader(channel_secret)
+
 channel_name = None  # ตัวแปรสำหรับเก็บชื่อช่อง
 
+dispatcher = EventDispatcher()
+
+@dispatcher.on("follow")
+def handle_follow(event):
+    save_user_uid(event['source']['userId'])
+
+@dispatcher.on_text
+def handle_text_events(events):
+    # Everything said to one event goes out in a single reply call, as
+    # soon as that event is done
+    with ReplyCollector(line_bot_api) as replies:
+        answer_text_events(replies, events)
+
+def answer_text_events(replies, events):
+    # Particles removed and keywords tagged in one pass
+    with metrics.span("pre_route"):
+        routes = [pre_router.route(event['message']['text']) for event in events]
+
+    # คำสั่งค้นหา YouTube ต้องทำตามลำดับเพราะใช้ channel_name ร่วมกัน
+    # Exact greetings are answered here too, without the model
+    pending = []
+    for event, route in zip(events, routes):
+        tk, uid = event['replyToken'], event['source'].get('userId')
+        answered = True
+        try:
+            answered = (handle_search_message(replies, tk, route)
+                        or handle_greeting_exact(replies, tk, uid, route.text))
+        except Exception as e:
+            print("Error:", e)
+            print(event)
+        if answered:
+            replies.flush(tk)  # Sent now, not after the slowest event
+        else:
+            pending.append((event, route.text))
+    if not pending:
+        return
+
+    # One encode call and one query per lookup for the rest of the batch
+    uids = [event['source'].get('userId') for event, msg in pending]
+    with metrics.span("encode"):
+        encode_many_cached(model, MODEL_NAME, [msg for event, msg in pending])
+    with metrics.span("prefetch"):
+        user_names = get_user_names(uids)
+        previous_answers = check_previous_questions([msg for event, msg in pending])
+
+    for (event, msg), uid in zip(pending, uids):
+        try:
+            handle_text_message(replies, event['replyToken'], uid, msg, user_names, previous_answers)
+        except Exception as e:
+            print("Error:", e)
+            print(event)
+        finally:
+            replies.flush(event['replyToken'])
+
+def handle_search_message(line_bot_api, tk, route):
+    # Returns True when the message was answered here
+    global channel_name  # ใช้ตัวแปร global เพื่อให้เข้าถึงได้ทั่วทั้งฟังก์ชัน
+    msg = route.text
+
+    # ตรวจสอบคำค้นหา
+    if route.intent == "search":
+        metrics.count_path("search_prompt")
+        # ถามชื่อช่อง
+        line_bot_api.reply_message(tk, TextSendMessage(text="กรุณาระบุชื่อช่อง"))
+        # บันทึกคำค้นหาเพื่อใช้ในภายหลัง
+        search_query = msg.replace("ค้นหา", "").strip()
+        if search_query:
+            # รอรับชื่อช่องจากผู้ใช้
+            channel_name = search_query
+            return True  # รอการตอบสนองจากผู้ใช้ในรอบถัดไป
+    
+    # ตรวจสอบว่าผู้ใช้ส่งชื่อช่องหรือไม่
+    if channel_name:
+        # หากพบชื่อช่อง ให้ทำการค้นหา YouTube
+        metrics.count_path("youtube_search")
+        search_results = youtube_scrape(channel_name + " " + msg)  # ค้นหาควบคู่กับชื่อช่อง
+        if search_results:
+            # Prepare the response message with top 5 YouTube video links
+            response_message = "ผลการค้นหาจาก YouTube:\n"
+            for i, result in enumerate(search_results):
+                response_message += f"{i+1}. {result['title']} - {result['link']}\n"
+            
+            # รีเซ็ต channel_name หลังจากใช้งาน
+            channel_name = None  
+            
+            line_bot_api.reply_message(tk, TextSendMessage(text=response_message))
+            return True  # ส่งกลับหลังจากตอบกลับ
+    return False
+
+def handle_greeting_exact(line_bot_api, tk, uid, msg):
+    # A message that is exactly a greeting name needs no embedding
+    response_msg = greeting_index.exact(msg)
+    if response_msg is None:
+        return False
+    metrics.count_path("greeting_exact")
+    line_bot_api.reply_message(tk, TextSendMessage(text=response_msg + " ค่ะ"))
+    log_chat_history(uid, msg, response_msg)
+    return True
+
+def handle_text_message(line_bot_api, tk, uid, msg, user_names, previous_answers):
+    # จัดการกรณีการถามชื่อ และฟังก์ชันอื่น ๆ ตามปกติ
+    user_name = user_names.get(uid)
+    if user_name and is_similar_query(msg, "ask_name"):
+        metrics.count_path("ask_name")
+        line_bot_api.reply_message(tk, TextSendMessage(text=f"ชื่อของคุณคือ {user_name} ค่ะ"))
+
+    response_msg = compute_response(msg)
+
+    if response_msg:
+        metrics.count_path("greeting")
+        line_bot_api.reply_message(tk, TextSendMessage(text=response_msg + " ค่ะ"))
+        log_chat_history(uid, msg, response_msg)  # Log the chat history
+    else:
+        previous_answer = previous_answers.get(msg)
+        if previous_answer:
+            metrics.count_path("previous_question")
+            line_bot_api.reply_message(tk, TextSendMessage(text=previous_answer + " ค่ะ"))
+        else:
+            # Paraphrases of questions Ollama already answered are served from the cache
+            msg_vec = encode_cached(model, MODEL_NAME, msg)
+            answer_text = answer_cache.lookup(msg_vec, uid)
+            metrics.count_path("answer_cache" if answer_text else "llm_fallback")
+            if not answer_text:
+                prompt = f"ผู้ถามชื่อ คุณ{user_name} ตอบสั้นๆไม่เกิน 20 คำ เกี่ยวกับ '{msg}'"
+                generation = ollama.generate(prompt, model="supachai/llama-3-typhoon-v1.5")
+                if generation.ok and generation.text:
+                    answer_cache.store(msg_vec, generation.text, uid)
+                answer_text = generation.text or 'ไม่มีคำตอบ'  # Default answer
+            line_bot_api.reply_message(tk, TextSendMessage(text=answer_text + " ค่ะ"))
+            save_response(uid, answer_text, response_msg)  # Save the response for logging
+
+# Start-up work, run in the background; /readyz turns 200 once it is done
+warmup = Warmup()
+
+@warmup.step
+def load_model():
+    # One dummy encode so the first user does not pay for lazy allocations
+    model.encode(["warm-up"], normalize_embeddings=True)
+
+@warmup.step
+def connect_db():
+    db.verify_connectivity()
+    ensure_schema()
+
+@warmup.step
+def build_indexes():
+    greeting_index.refresh(force=True)
+    intent_registry.register("ask_name", ["ชื่ออะไร", "ผมชื่ออะไร", "ชื่อของฉัน"])
+
+@warmup.step
+def warm_browser():
+    # Off by default: the pool otherwise starts Chrome on the first search
+    if os.environ.get("WARM_BROWSER") == "1":
+        browser_pool.warm()
+
+warmup.register_routes(app)
+metrics.register_routes(app)
+warmup.start()
+
+def handle_events(json_data):
+    with metrics.trace("webhook"):
+        dispatcher.dispatch(json_data)
+
+event_worker = EventWorker(handle_events)
+if ASYNC_WEBHOOK:
+    event_worker.start()
+
 @app.route("/", methods=['POST'])
 def linebot():
-    global channel_name  # ใช้ตัวแปร global เพื่อให้เข้าถึงได้ทั่วทั้งฟังก์ชัน
+    if not warmup.ready:
+        return 'Starting', 503
+
     body = request.get_data(as_text=True)
     try:
-        json_data = json.loads(body)
-        line_bot_api = LineBotApi(channel_access_token)
-        handler = WebhookHandler(channel_secret)
-        signature = request.headers['X-Line-Signature']
-        handler.handle(body, signature)
-
-        msg = json_data['events'][0]['message']['text']
-        tk = json_data['events'][0]['replyToken']
-        uid = json_data['events'][0]['source']['userId']
-
-        # Remove ending phrases
-        msg = remove_endings(msg)
-        
-        # ตรวจสอบคำค้นหา
-        if "ค้นหา" in msg:
-            # ถามชื่อช่อง
-            line_bot_api.reply_message(tk, TextSendMessage(text="กรุณาระบุชื่อช่อง"))
-            # บันทึกคำค้นหาเพื่อใช้ในภายหลัง
-            search_query = msg.replace("ค้นหา", "").strip()
-            if search_query:
-                # รอรับชื่อช่องจากผู้ใช้
-                channel_name = search_query
-                return 'OK'  # รอการตอบสนองจากผู้ใช้ในรอบถัดไป
-        
-        # ตรวจสอบว่าผู้ใช้ส่งชื่อช่องหรือไม่
-        if channel_name:
-            # หากพบชื่อช่อง ให้ทำการค้นหา YouTube
-            search_results = youtube_scrape(channel_name + " " + msg)  # ค้นหาควบคู่กับชื่อช่อง
-            if search_results:
-                # Prepare the response message with top 5 YouTube video links
-                response_message = "ผลการค้นหาจาก YouTube:\n"
-                for i, result in enumerate(search_results):
-                    response_message += f"{i+1}. {result['title']} - {result['link']}\n"
-                
-                # รีเซ็ต channel_name หลังจากใช้งาน
-                channel_name = None  
-                
-                line_bot_api.reply_message(tk, TextSendMessage(text=response_message))
-                return 'OK'  # ส่งกลับหลังจากตอบกลับ
-
-        # จัดการกรณีการถามชื่อ และฟังก์ชันอื่น ๆ ตามปกติ
-        user_name = get_user_name(uid)
-        if user_name and is_similar_query(msg, ["ชื่ออะไร", "ผมชื่ออะไร", "ชื่อของฉัน"]):
-            line_bot_api.reply_message(tk, TextSendMessage(text=f"ชื่อของคุณคือ {user_name} ค่ะ"))
-
-        response_msg = compute_response(msg)
-
-        if response_msg:
-            line_bot_api.reply_message(tk, TextSendMessage(text=response_msg + " ค่ะ"))
-            log_chat_history(uid, msg, response_msg)  # Log the chat history
-        else:
-            previous_answer = check_previous_question(msg)
-            if previous_answer:
-                line_bot_api.reply_message(tk, TextSendMessage(text=previous_answer + " ค่ะ"))
-            else:
-                payload = {
-                    "model": "supachai/llama-3-typhoon-v1.5",
-                    "prompt": f"ผู้ถามชื่อ คุณ{user_name} ตอบสั้นๆไม่เกิน 20 คำ เกี่ยวกับ '{msg}'",
-                    "stream": False
-                }
-                response = requests.post(OLLAMA_API_URL, headers=headers, data=json.dumps(payload))
-                answer_text = response.json().get('text', 'ไม่มีคำตอบ')  # Default answer
-                line_bot_api.reply_message(tk, TextSendMessage(text=answer_text + " ค่ะ"))
-                save_response(uid, answer_text, response_msg)  # Save the response for logging
+        # Signature check and JSON decode in one pass
+        json_data = webhook_reader.parse(body, request.headers['X-Line-Signature'])
+
+        if not ASYNC_WEBHOOK:
+            handle_events(json_data)
+        elif not event_worker.submit(json_data):
+            # Queue is full: refuse so LINE retries later instead of piling up work
+            return 'Busy', 503
 
     except InvalidSignatureError:
         print("Invalid signature.")
@@ -240,5 +355,13 @@ def linebot():
         print(body)
     return 'OK'
 
+@app.route("/queue", methods=['GET'])
+def queue_stats():
+    return jsonify(event_worker.stats())
+
+@app.route("/search_cache", methods=['GET'])
+def search_cache_stats():
+    return jsonify(search_cache.stats())
+
 if __name__ == "__main__":
     app.run(port=5000)
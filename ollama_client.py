@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Shared Ollama client. One pooled keep-alive session for every caller, with
+# connect/read timeouts, and a streaming mode that yields tokens as the NDJSON
+# chunks arrive and can stop as soon as a word or character budget is hit.
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+DEFAULT_MODEL = os.environ.get("OLLAMA_MODEL", "supachai/llama-3-typhoon-v1.5")
+POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "120"))
+# Optional cap on answer length; the bots only ever send short replies.
+MAX_CHARS = int(os.environ["OLLAMA_MAX_CHARS"]) if os.environ.get("OLLAMA_MAX_CHARS") else None
+
+
+class Generation:
+    def __init__(self):
+        self.text = ""
+        self.status_code = None
+        self.error = None
+        self.raw = None
+        self.time_to_first_token = None
+        self.total_time = None
+        self.truncated = False
+
+    @property
+    def ok(self):
+        return self.status_code == 200 and self.error is None
+
+    def __repr__(self):
+        return (f"Generation(ok={self.ok}, chars={len(self.text)}, "
+                f"ttft={self.time_to_first_token}, total={self.total_time})")
+
+
+def _over_budget(text, max_words, max_chars):
+    if max_chars is not None and len(text) >= max_chars:
+        return True
+    if max_words is not None and len(text.split()) >= max_words:
+        return True
+    return False
+
+
+# Clients alive in this process. A forked child (WEBHOOK_WORKER_KIND=process)
+# would otherwise share the parent's keep-alive sockets, so they get a new
+# session after fork.
+_clients = weakref.WeakSet()
+
+
+class OllamaClient:
+    def __init__(self, base_url=OLLAMA_URL, pool_size=POOL_SIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.generate_url = base_url.rstrip("/") + "/api/generate"
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self._reset()
+        _clients.add(self)
+        self.requests = 0
+        self.failures = 0
+        self.ttft_total = 0.0
+
+    def _reset(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+
+    def stream(self, prompt, model=DEFAULT_MODEL, max_words=None, max_chars=MAX_CHARS, result=None, **options):
+        # Yields response tokens as they arrive. Pass a Generation as `result`
+        # to get the timings and status once the generator is exhausted.
+        result = result if result is not None else Generation()
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        if options:
+            payload["options"] = options
+        started = time.perf_counter()
+        try:
+            with self.session.post(self.generate_url, json=payload, stream=True, timeout=self.timeout) as response:
+                result.status_code = response.status_code
+                if response.status_code != 200:
+                    result.error = response.text
+                    return
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        result.error = chunk["error"]
+                        return
+                    token = chunk.get("response", "")
+                    if token:
+                        if result.time_to_first_token is None:
+                            result.time_to_first_token = time.perf_counter() - started
+                        result.text += token
+                        yield token
+                    if chunk.get("done"):
+                        break
+                    if _over_budget(result.text, max_words, max_chars):
+                        # Leaving the with-block drops the connection, which
+                        # tells Ollama to stop generating.
+                        result.truncated = True
+                        break
+        except (requests.RequestException, ValueError) as e:
+            result.error = str(e)
+        finally:
+            result.total_time = time.perf_counter() - started
+            self._record(result)
+
+    def generate(self, prompt, model=DEFAULT_MODEL, stream=True, max_words=None, max_chars=MAX_CHARS, **options):
+        result = Generation()
+        if stream:
+            for _ in self.stream(prompt, model, max_words, max_chars, result=result, **options):
+                pass
+            return result
+
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if options:
+            payload["options"] = options
+        started = time.perf_counter()
+        try:
+            response = self.session.post(self.generate_url, json=payload, timeout=self.timeout)
+            result.status_code = response.status_code
+            result.raw = response.text
+            if response.status_code == 200:
+                result.text = response.json().get("response", "")
+            else:
+                result.error = response.text
+        except (requests.RequestException, ValueError) as e:
+            result.error = str(e)
+        result.total_time = time.perf_counter() - started
+        result.time_to_first_token = result.total_time if result.ok else None
+        self._record(result)
+        return result
+
+    def _record(self, result):
+        metrics.observe("ollama", result.total_time)
+        if not result.ok:
+            metrics.stage_errors.inc("ollama")
+        if result.time_to_first_token is not None:
+            metrics.observe("ollama.first_token", result.time_to_first_token)
+        with self._lock:
+            self.requests += 1
+            if not result.ok:
+                self.failures += 1
+            elif result.time_to_first_token is not None:
+                self.ttft_total += result.time_to_first_token
+
+    def stats(self):
+        with self._lock:
+            succeeded = self.requests - self.failures
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "avg_time_to_first_token": self.ttft_total / succeeded if succeeded else 0.0,
+            }
+
+
+def _reset_after_fork():
+    for client in list(_clients):
+        client._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# Process-wide client shared by every caller.
+ollama = OllamaClient()
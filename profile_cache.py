@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Read-through cache for user profiles (uid -> display name). Misses for a
+# whole batch of uids are loaded with one call to `load_many`; save paths
+# write through with put()/add() so the next message needs no lookup at all.
+# Unknown uids can be cached too (negative caching) for `negative_ttl`
+# seconds. Entries also expire after `ttl` so names changed by another
+# worker process are picked up eventually.
+
+MAX_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "10000"))
+TTL = float(os.environ.get("PROFILE_CACHE_TTL", "600"))
+NEGATIVE_TTL = float(os.environ.get("PROFILE_CACHE_NEGATIVE_TTL", "60"))
+
+_UNKNOWN = object()
+
+
+class ProfileCache:
+    def __init__(self, load_many, maxsize=MAX_SIZE, ttl=TTL, negative_ttl=NEGATIVE_TTL):
+        # load_many(uids) -> {uid: name} for the users that exist; a user
+        # without a name maps to None. negative_ttl=0 disables negative caching.
+        self.load_many = load_many
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _set(self, uid, value, ttl):
+        # Caller holds the lock.
+        self._data[uid] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(uid)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get_many(self, uids):
+        # Returns {uid: name} for every known uid (name may be None).
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for uid in dict.fromkeys(uids):
+                if uid is None:
+                    continue
+                entry = self._data.get(uid)
+                if entry is not None and entry[1] > now:
+                    self._data.move_to_end(uid)
+                    self.hits += 1
+                    if entry[0] is not _UNKNOWN:
+                        found[uid] = entry[0]
+                else:
+                    self.misses += 1
+                    missing.append(uid)
+        if missing:
+            loaded = self.load_many(missing)
+            with self._lock:
+                self.loads += 1
+                for uid in missing:
+                    if uid in loaded:
+                        self._set(uid, loaded[uid], self.ttl)
+                    elif self.negative_ttl > 0:
+                        self._set(uid, _UNKNOWN, self.negative_ttl)
+            found.update((uid, loaded[uid]) for uid in missing if uid in loaded)
+        return found
+
+    def get(self, uid):
+        return self.get_many([uid]).get(uid)
+
+    def put(self, uid, name):
+        # Write-through after the profile was saved.
+        with self._lock:
+            self._set(uid, name, self.ttl)
+
+    def add(self, uid):
+        # The user now exists. Only a cached "unknown" is replaced: a
+        # returning user (e.g. after unblocking) may already have a name, so
+        # an uncached uid is left for the next get() to load.
+        with self._lock:
+            entry = self._data.get(uid)
+            if entry is not None and entry[0] is _UNKNOWN:
+                self._set(uid, None, self.ttl)
+
+    def invalidate(self, uid):
+        with self._lock:
+            self._data.pop(uid, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
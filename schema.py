@@ -0,0 +1,54 @@
+import db
+
+# Startup schema migration: the constraints and indexes the bots' MERGE and
+# MATCH lookups rely on, created idempotently and then checked, so those
+# lookups are index seeks rather than label scans.
+
+CONSTRAINTS = {
+    "user_uid_unique": "CREATE CONSTRAINT user_uid_unique IF NOT EXISTS FOR (u:User) REQUIRE u.uid IS UNIQUE",
+}
+
+INDEXES = {
+    "greeting_name": "CREATE INDEX greeting_name IF NOT EXISTS FOR (n:Greeting) ON (n.name)",
+    "question_text": "CREATE INDEX question_text IF NOT EXISTS FOR (n:Question) ON (n.text)",
+    "barista_question": "CREATE INDEX barista_question IF NOT EXISTS FOR (n:Barista) ON (n.question)",
+}
+
+# Used when the uniqueness constraint cannot be created because the data
+# already holds duplicate uids; lookups are still index seeks.
+FALLBACK_INDEXES = {
+    "user_uid_unique": ("user_uid", "CREATE INDEX user_uid IF NOT EXISTS FOR (u:User) ON (u.uid)"),
+}
+
+
+def existing_schema():
+    constraints = {record['name'] for record in db.read_query("SHOW CONSTRAINTS YIELD name")}
+    indexes = {record['name']: record['state'] for record in db.read_query("SHOW INDEXES YIELD name, state")}
+    return constraints, indexes
+
+
+def ensure_schema(wait_seconds=300):
+    # Returns the names of the schema objects in place; raises if any is
+    # still missing afterwards.
+    expected = set(INDEXES)
+    for name, statement in CONSTRAINTS.items():
+        try:
+            db.write_query(statement)
+            expected.add(name)
+        except Exception as e:
+            fallback_name, fallback = FALLBACK_INDEXES[name]
+            print(f"Could not create constraint {name} ({e}); creating index {fallback_name} instead")
+            db.write_query(fallback)
+            expected.add(fallback_name)
+    for statement in INDEXES.values():
+        db.write_query(statement)
+    db.write_query("CALL db.awaitIndexes($timeout)", {'timeout': wait_seconds})
+
+    constraints, indexes = existing_schema()
+    missing = sorted(name for name in expected if name not in constraints and name not in indexes)
+    if missing:
+        raise RuntimeError(f"Neo4j schema is missing: {', '.join(missing)}")
+    not_online = sorted(name for name in expected if indexes.get(name, 'ONLINE') != 'ONLINE')
+    if not_online:
+        print(f"Neo4j indexes not online yet: {', '.join(not_online)}")
+    return sorted(expected)
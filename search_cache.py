@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Result cache for YouTube searches, keyed on the normalized query, with TTL
+# and size limits. Concurrent identical searches are coalesced: the first
+# caller runs the scrape and everyone else waits on its result. Set
+# SEARCH_CACHE_PATH (or pass disk_path) to add an SQLite layer that survives
+# restarts and is shared by worker processes.
+
+MAX_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "1000"))
+TTL = float(os.environ.get("SEARCH_CACHE_TTL", "3600"))
+DISK_PATH = os.environ.get("SEARCH_CACHE_PATH") or None
+
+
+def normalize_query(query):
+    return " ".join(query.split()).casefold()
+
+
+class SearchCache:
+    def __init__(self, namespace="", maxsize=MAX_SIZE, ttl=TTL, disk_path=DISK_PATH):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        if disk_path:
+            with self._connect() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS search_cache "
+                             "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.disk_path, timeout=5)
+
+    def _key(self, query):
+        return f"{self.namespace}:{normalize_query(query)}"
+
+    def _get_memory(self, key):
+        # Caller holds the lock.
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires <= time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _put_memory(self, key, value, expires):
+        # Caller holds the lock.
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def _get_disk(self, key):
+        if not self.disk_path:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, expires FROM search_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _put_disk(self, key, value, expires):
+        if not self.disk_path:
+            return
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO search_cache (key, value, expires) VALUES (?, ?, ?)",
+                         (key, json.dumps(value, ensure_ascii=False), expires))
+            conn.execute("DELETE FROM search_cache WHERE expires <= ?", (time.time(),))
+
+    def get_or_fetch(self, query, fetch):
+        # fetch(query) runs at most once per key at a time. Empty or None
+        # results are handed back but never cached.
+        key = self._key(query)
+        with self._lock:
+            value = self._get_memory(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            stored = self._get_disk(key)
+            if stored is not None:
+                value, expires = stored
+                with self._lock:
+                    self.disk_hits += 1
+                    self._put_memory(key, value, expires)
+            else:
+                with self._lock:
+                    self.misses += 1
+                value = fetch(query)
+                if value:
+                    expires = time.time() + self.ttl
+                    with self._lock:
+                        self._put_memory(key, value, expires)
+                    self._put_disk(key, value, expires)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "inflight": len(self._inflight),
+            }
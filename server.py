@@ -1,8 +1,8 @@
 from typing import Union
 from fastapi import FastAPI
 from pydantic import BaseModel
-import json
-import requests
+
+from ollama_client import ollama
 
 app = FastAPI(debug=True)
 
@@ -16,12 +16,6 @@ class Item(BaseModel):
     model: str
     prompt: str
 
-urls =["http://localhost:11434/api/generate"]
-
-headers = {
-    "Content-Type": "application/json"
-}
-
 
 @app.get("/")
 def read_root():
@@ -30,16 +24,10 @@ def read_root():
 @app.post("/chat/{llms_name}")
 def update_item(llms_name: str, item: Item):
     if llms_name == "llama3":
-        url = urls[0]
-        payload = {
-            "model": "llama3",
-            "prompt": "ทำไมท้องฟ้าถึงสีฟ้า?",
-            "stream": False
-        }
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
-        if response.status_code == 200:
-            return {"data": response.text, "llms_name": llms_name}
+        generation = ollama.generate("ทำไมท้องฟ้าถึงสีฟ้า?", model="llama3", stream=False)
+        if generation.ok:
+            return {"data": generation.raw, "llms_name": llms_name}
         else:
-            print("error:", response.status_code, response.text)
-            return {"item_name": item.model, "error": response.status_code, "data": response.text}
+            print("error:", generation.status_code, generation.error)
+            return {"item_name": item.model, "error": generation.status_code, "data": generation.error}
     return {"item_name": item.model, "llms_name": llms_name}
\ No newline at end of file
@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+import traceback
+
+# Deferred initialization for the bots. Importing a bot no longer loads the
+# SentenceTransformer or talks to Neo4j; instead the bot registers warm-up
+# steps (connect, migrate schema, build indexes, one dummy encode) and
+# Warmup runs them in a background thread, retrying until they all succeed.
+# /healthz answers as soon as the process is up; /readyz only returns 200 once
+# the warm-up has finished, so a rolling restart only routes traffic to
+# workers that are fully warmed.
+#
+# WARMUP_MODE=background (default) warms in a thread, WARMUP_MODE=blocking
+# warms before the import returns, WARMUP_MODE=off leaves it to the caller.
+
+WARMUP_MODE = os.environ.get("WARMUP_MODE", "background")
+RETRY_DELAY = float(os.environ.get("WARMUP_RETRY_DELAY", "2"))
+MAX_RETRY_DELAY = float(os.environ.get("WARMUP_MAX_RETRY_DELAY", "30"))
+
+
+class LazyModel:
+    # Stands in for a SentenceTransformer and loads it on first use, so the
+    # indexes and caches can hold a reference before the weights are read.
+    def __init__(self, name, loader=None):
+        self.name = name
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    loader = self._loader
+                    if loader is None:
+                        from sentence_transformers import SentenceTransformer
+                        loader = SentenceTransformer
+                    self._model = loader(self.name)
+        return self._model
+
+    def encode(self, *args, **kwargs):
+        return self.load().encode(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+
+class Warmup:
+    def __init__(self, retry_delay=RETRY_DELAY, max_retry_delay=MAX_RETRY_DELAY):
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._steps = []
+        self._done = set()
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started_at = time.time()
+        self.timings = {}
+        self.attempts = 0
+        self.last_error = None
+
+    def step(self, fn=None, name=None):
+        # Decorator; steps run once each, in registration order.
+        def register(fn):
+            self._steps.append((name or fn.__name__, fn))
+            return fn
+        return register(fn) if fn is not None else register
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def run(self):
+        # Runs every step that has not succeeded yet; raises on the first
+        # failure so the caller can retry.
+        with self._lock:
+            self.attempts += 1
+            for name, fn in self._steps:
+                if name in self._done:
+                    continue
+                started = time.perf_counter()
+                fn()
+                self.timings[name] = round(time.perf_counter() - started, 3)
+                self._done.add(name)
+            self.last_error = None
+            self._ready.set()
+
+    def _run_until_ready(self):
+        delay = self.retry_delay
+        while not self.ready:
+            try:
+                self.run()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Warm-up failed, retrying in {delay:.0f}s:", self.last_error)
+                traceback.print_exc()
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        print(f"Warm-up finished in {time.time() - self.started_at:.1f}s:", self.timings)
+
+    def start(self, mode=WARMUP_MODE):
+        if mode == "blocking":
+            self._run_until_ready()
+        elif mode == "background" and self._thread is None:
+            self._thread = threading.Thread(target=self._run_until_ready, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "steps": [name for name, _ in self._steps],
+            "done": [name for name, _ in self._steps if name in self._done],
+            "timings": dict(self.timings),
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "uptime": round(time.time() - self.started_at, 1),
+        }
+
+    def register_routes(self, app):
+        from flask import jsonify
+
+        @app.route("/healthz", methods=['GET'])
+        def healthz():
+            # Liveness only: the process is up and serving HTTP
+            return jsonify({"status": "ok"})
+
+        @app.route("/readyz", methods=['GET'])
+        def readyz():
+            status = self.status()
+            return jsonify(status), 200 if status["ready"] else 503
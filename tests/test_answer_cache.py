@@ -0,0 +1,23 @@
+import numpy as np
+
+from answer_cache import SemanticAnswerCache
+
+
+def test_user_scope_forgets_uids_without_slots():
+    cache = SemanticAnswerCache(maxsize=4, scope="user")
+    vectors = np.eye(8, dtype=np.float32)
+    for i in range(100):
+        cache.store(vectors[i % 8], f"answer {i}", uid=f"U{i}")
+    assert len(cache) == 4
+    assert len(cache._owner_ids) == len(cache._owned) == 4
+
+    assert cache.lookup(vectors[99 % 8], uid="U99") == "answer 99"
+    assert cache.lookup(vectors[99 % 8], uid="U98") is None
+    assert cache.lookup(vectors[0], uid="U0") is None  # evicted, uid forgotten
+
+    cache.store(vectors[1], "again", uid="U99")
+    cache.ttl = -1
+    cache.store(vectors[2], "expired", uid="U1")
+    cache.lookup(vectors[1], uid="U99")  # releases the expired slot
+    assert "U1" not in cache._owner_ids
+    assert cache._owned[cache._owner_ids["U99"]][1] == 2
@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip("neo4j")
+
+import conversation
+import db
+from conversation import ConversationStore
+
+
+def test_persisted_turns_are_loaded_outside_the_lock_and_queued(monkeypatch):
+    store = ConversationStore(persist=True)
+    reads, submitted = [], []
+
+    def read_query(query, parameters):
+        reads.append(store._lock.locked())
+        return [{"role": "bot", "text": "สวัสดี"}, {"role": "user", "text": "หวัดดี"}]
+
+    def write_query(query, parameters):
+        raise AssertionError("turns go through the write-behind journal")
+
+    monkeypatch.setattr(db, "read_query", read_query)
+    monkeypatch.setattr(db, "write_query", write_query)
+    monkeypatch.setattr(conversation.journal, "submit", lambda kind, row: submitted.append((kind, row)))
+
+    store.append("U1", "user", "กาแฟ")
+    store.append("U1", "bot", "ลาเต้")
+
+    assert reads == [False]  # loaded once, without holding the lock
+    assert store.history("U1") == ["user:หวัดดี", "bot:สวัสดี", "user:กาแฟ", "bot:ลาเต้"]
+    assert [(kind, row["role"], row["text"]) for kind, row in submitted] == [
+        ("turn", "user", "กาแฟ"), ("turn", "bot", "ลาเต้")]
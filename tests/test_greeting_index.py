@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("neo4j")
+
+import db
+from greeting_index import GreetingIndex
+
+
+class Model:
+    def encode(self, texts, normalize_embeddings=True):
+        return np.eye(len(texts), 4, dtype=np.float32)
+
+
+def test_failed_refresh_keeps_serving(monkeypatch):
+    monkeypatch.setattr(db, "read_query", lambda query: [{"name": "สวัสดี", "reply": "สวัสดีครับ"}])
+    index = GreetingIndex(Model(), refresh_interval=0)
+    index.refresh(force=True)
+
+    def fail(query):
+        raise ConnectionError("neo4j down")
+
+    monkeypatch.setattr(db, "read_query", fail)
+    assert index.exact("สวัสดี") == "สวัสดีครับ"
+    assert index.match(np.eye(1, 4, dtype=np.float32)[0]) == "สวัสดีครับ"
+    with pytest.raises(ConnectionError):
+        index.refresh(force=True)
@@ -0,0 +1,81 @@
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from vector_index import create_index, load_index
+
+
+def _unit(rng, n, dim=16):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_search_during_add_only_sees_rows_with_ids():
+    # Switch threads often so readers land in the middle of add().
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        for kind in ("exact", "ivf"):
+            _search_during_add(create_index(kind))
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def _search_during_add(index):
+    vectors = _unit(np.random.default_rng(0), 20000)
+    index.add(["q0"], vectors[:1])
+    errors = []
+    done = threading.Event()
+
+    def search():
+        while not done.is_set():
+            # The newest row, i.e. a paraphrase of the question just added.
+            try:
+                index.search(vectors[len(index) - 1], k=3)
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    for i in range(1, len(vectors)):
+        index.add([f"q{i}"], vectors[i:i + 1])
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+    assert index.search(vectors[-1], k=1)[0][0] == f"q{len(vectors) - 1}"
+
+
+def test_base_rows_are_served_from_the_callers_matrix(tmp_path):
+    vectors = _unit(np.random.default_rng(1), 3000)
+    path = tmp_path / "base.f32"
+    vectors.tofile(path)
+    base = np.memmap(path, dtype=np.float32, mode="r", shape=vectors.shape)
+    ids = [f"q{i}" for i in range(len(vectors))]
+    extra = _unit(np.random.default_rng(2), 5)
+
+    for kind in ("exact", "ivf"):
+        index = create_index(kind, **({"train_threshold": 1000} if kind == "ivf" else {}))
+        index.set_base(ids, base)
+        index.add([f"x{i}" for i in range(5)], extra)
+        assert index._base is base
+        assert len(index._vectors) < len(vectors)  # only the added rows are held
+        assert index.search(vectors[1234], k=1)[0][0] == "q1234"
+        assert index.search(extra[3], k=1)[0][0] == "x3"
+
+        saved = tmp_path / f"{kind}.npz"
+        index.save(saved)
+        with np.load(saved) as data:
+            assert len(data["vectors"]) == 5
+        loaded = load_index(saved, base_ids=ids, base=base)
+        assert len(loaded) == len(index)
+        assert loaded.search(vectors[42], k=1)[0][0] == "q42"
+        assert loaded.search(extra[4], k=1)[0][0] == "x4"
+        with pytest.raises(ValueError):
+            load_index(saved, base_ids=ids[1:], base=base[1:])
+        with pytest.raises(ValueError):
+            load_index(saved)
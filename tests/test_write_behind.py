@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+pytest.importorskip("neo4j")
+
+import db
+from write_behind import WriteBehindJournal
+
+
+@pytest.fixture
+def written(monkeypatch):
+    rows = []
+    monkeypatch.setattr(db, "write_query", lambda query, parameters: rows.extend(parameters['rows']))
+    return rows
+
+
+def test_truncated_spill_line_is_quarantined(tmp_path, written):
+    spill = tmp_path / "spill.jsonl"
+    good = json.dumps({"kind": "user", "row": {"uid": "U1"}})
+    spill.write_text(good + "\n" + '{"kind": "chat", "row": {"uid": "U', encoding="utf-8")
+    journal = WriteBehindJournal(spill_path=str(spill))
+    journal._pending.append(("user", {"uid": "U2"}))
+
+    assert journal.flush() == 2
+    assert written == [{"uid": "U1"}, {"uid": "U2"}]
+    assert journal.stats()["corrupt"] == 1
+    assert (tmp_path / "spill.jsonl.corrupt").read_text(encoding="utf-8").startswith('{"kind": "chat"')
+    assert not spill.exists() and not (tmp_path / "spill.jsonl.replay").exists()
+
+    # Later flushes are unaffected.
+    journal._pending.append(("user", {"uid": "U3"}))
+    assert journal.flush() == 1
+
+
+def test_spill_after_torn_line_starts_a_new_line(tmp_path, written):
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text('{"kind": "user", "row": {"ui', encoding="utf-8")
+    journal = WriteBehindJournal(spill_path=str(spill))
+    journal._spill([("user", {"uid": "U1"})])
+
+    assert journal.flush() == 1
+    assert written == [{"uid": "U1"}]
+
+
+def test_taken_rows_are_restored_when_spilling_fails(tmp_path, monkeypatch):
+    def fail(query, parameters):
+        raise RuntimeError("neo4j down")
+
+    monkeypatch.setattr(db, "write_query", fail)
+    journal = WriteBehindJournal(spill_path=str(tmp_path / "missing" / "spill.jsonl"))
+    journal._pending.append(("user", {"uid": "U1"}))
+
+    with pytest.raises(OSError):
+        journal.flush()
+    assert journal._pending == [("user", {"uid": "U1"})]
@@ -0,0 +1,129 @@
+from collections import deque, namedtuple
+
+# Text clean-up and rule routing shared by the LINE bots.
+#
+# Particles and command keywords are compiled into one Aho-Corasick
+# automaton, so a message is normalized (particles dropped) and tagged with
+# the keywords it contains in a single left-to-right pass. Overlapping hits
+# resolve leftmost-longest: "นะจ้ะ" is one particle rather than "นะ" + "จ้ะ",
+# and "เชื่อ" is its own keyword instead of containing "ชื่อ".
+
+# Polite particles stripped from a message before it is matched.
+ENDINGS = ["ครับ", "ค่ะ", "น้ะ", "นะ", "นะจ้ะ"]
+
+PARTICLE = "particle"
+
+Match = namedtuple("Match", "start end keyword label")
+
+
+class Route(namedtuple("Route", "text intent tags spans")):
+    # spans: (start, end, tag) of every keyword, as positions in `text`.
+    __slots__ = ()
+
+    def after(self, tag):
+        # The text following the last keyword tagged `tag`, or None.
+        ends = [end for start, end, label in self.spans if label == tag]
+        return self.text[ends[-1]:].strip() if ends else None
+
+
+class Automaton:
+    def __init__(self, keywords):
+        # keywords: {keyword: label}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for keyword, label in keywords.items():
+            if not keyword:
+                raise ValueError("Empty keyword")
+            state = 0
+            for char in keyword:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] = ((keyword, label),)
+
+        # Breadth-first: fail links point at the longest proper suffix that
+        # is also a prefix, and every state inherits the outputs of its
+        # fail state. The fail links are then folded into one transition
+        # table per state, so scanning is a single dict lookup per character.
+        self._delta = [dict(self._goto[0])] + [None] * (len(self._goto) - 1)
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._delta[state] = {**self._delta[self._fail[state]], **self._goto[state]}
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                self._fail[nxt] = self._delta[self._fail[state]].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+                self._delta[nxt] = {**self._delta[self._fail[nxt]], **self._goto[nxt]}
+
+    def iter_matches(self, text):
+        # Every occurrence of every keyword, overlapping ones included.
+        delta, out = self._delta, self._out
+        state = 0
+        for end, char in enumerate(text, 1):
+            state = delta[state].get(char, 0)
+            for keyword, label in out[state]:
+                yield Match(end - len(keyword), end, keyword, label)
+
+    def matches(self, text):
+        # Non-overlapping matches, leftmost first and longest at each start.
+        found = sorted(self.iter_matches(text), key=lambda match: (match.start, -len(match.keyword)))
+        selected = []
+        position = 0
+        for match in found:
+            if match.start >= position:
+                selected.append(match)
+                position = match.end
+        return selected
+
+
+class PreRouter:
+    # Normalizes a message and classifies it with keyword rules before any
+    # model or database is involved. `rules` is an ordered list of
+    # (intent, tags that must all be present[, tags that must be absent]);
+    # the first satisfied rule wins.
+    def __init__(self, keywords=None, rules=(), particles=ENDINGS):
+        table = {particle: PARTICLE for particle in particles}
+        for keyword, tag in (keywords or {}).items():
+            table[keyword] = tag
+        self.automaton = Automaton(table)
+        self.rules = []
+        for intent, required, *excluded in rules:
+            self.rules.append((intent, frozenset(required), frozenset(excluded[0] if excluded else ())))
+
+    def route(self, text):
+        pieces = []
+        spans = []
+        removed = 0
+        position = 0
+        for match in self.automaton.matches(text):
+            if match.label == PARTICLE:
+                pieces.append(text[position:match.start])
+                position = match.end
+                removed += len(match.keyword)
+            else:
+                spans.append((match.start - removed, match.end - removed, match.label))
+        pieces.append(text[position:])
+        joined = "".join(pieces)
+        normalized = joined.strip()
+        if spans:
+            lead = len(joined) - len(joined.lstrip())
+            spans = [(start - lead, end - lead, tag) for start, end, tag in spans]
+        tags = frozenset(tag for start, end, tag in spans)
+        intent = next((intent for intent, required, excluded in self.rules
+                       if required <= tags and not excluded & tags), None)
+        return Route(normalized, intent, tags, tuple(spans))
+
+
+_particles = PreRouter()
+
+
+def remove_endings(text):
+    return _particles.route(text).text
@@ -0,0 +1,332 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+# Vector indexes for normalized embeddings (score = dot product = cosine).
+# Every backend has the same interface: add() for incremental inserts,
+# search() for the top-k (id, score) pairs, save() / load_index() for disk.
+# `meta` is a free-form JSON dict saved with the index, e.g. which encoder
+# produced the vectors.
+#
+# set_base() serves a matrix the index does not own, e.g. an EmbeddingStore
+# memmap, as the first rows without copying it, so worker processes share
+# its pages; only rows add()ed later are held in memory. save() writes the
+# ids and the index state but not the base vectors, which have to be passed
+# back to load_index().
+#
+#   ExactIndex  brute force over one contiguous matrix; the reference result.
+#   IVFIndex    inverted file: vectors are bucketed under k-means centroids
+#               and a query only scans the `nprobe` closest buckets, so
+#               lookups stay sub-linear as the corpus grows.
+
+
+class VectorIndex:
+    kind = None
+
+    def __init__(self, dim=None):
+        self.dim = dim
+        self._ids = []
+        self._rows = {}
+        # Rows below _base_count are in _base; the rest in _vectors.
+        self._base = None
+        self._base_count = 0
+        self._vectors = None
+        self._count = 0
+        self._lock = threading.Lock()
+        self.meta = {}
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    @property
+    def ids(self):
+        return list(self._ids)
+
+    def set_base(self, ids, vectors):
+        # Only on an empty index. float16 matrices are widened, i.e. copied.
+        vectors = np.atleast_2d(vectors)
+        if vectors.dtype != np.float32:
+            vectors = vectors.astype(np.float32)
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+        if len(set(ids)) != len(ids):
+            raise ValueError("base ids must be unique")
+        with self._lock:
+            if self._count:
+                raise ValueError("set_base() needs an empty index")
+            if not len(ids):
+                return 0
+            self._attach(ids, vectors)
+            self._on_add(0, vectors)
+            return len(ids)
+
+    def _attach(self, ids, vectors):
+        if self.dim is not None and vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dim {self.dim}, got {vectors.shape[1]}")
+        self.dim = vectors.shape[1]
+        self._base, self._base_count = vectors, len(vectors)
+        self._ids = list(ids)
+        self._rows = {item_id: row for row, item_id in enumerate(self._ids)}
+        self._count = len(vectors)
+
+    def add(self, ids, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+        with self._lock:
+            fresh = [i for i, item_id in enumerate(ids) if item_id not in self._rows]
+            # Keep the first vector when the same id shows up twice in one call.
+            seen = set()
+            fresh = [i for i in fresh if not (ids[i] in seen or seen.add(ids[i]))]
+            if not fresh:
+                return 0
+            vectors = vectors[fresh]
+            start = self._count
+            count = self._append(vectors)
+            for offset, i in enumerate(fresh):
+                self._rows[ids[i]] = start + offset
+                self._ids.append(ids[i])
+            # search() takes no lock and only reads rows below _count, so
+            # publish the new rows after their ids are in place.
+            self._count = count
+            self._on_add(start, vectors)
+            return len(fresh)
+
+    def _append(self, vectors):
+        # Writes `vectors` after the published rows and returns the new row
+        # count; the caller sets _count.
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dim {self.dim}, got {vectors.shape[1]}")
+        used = self._count - self._base_count
+        needed = used + len(vectors)
+        if self._vectors is None or needed > len(self._vectors):
+            # Grow geometrically so repeated single inserts stay amortized O(1).
+            capacity = max(needed, 2 * (0 if self._vectors is None else len(self._vectors)), 64)
+            grown = np.empty((capacity, self.dim), dtype=np.float32)
+            if used:
+                grown[:used] = self._vectors[:used]
+            self._vectors = grown
+        self._vectors[used:needed] = vectors
+        return self._base_count + needed
+
+    def _scores(self, count, query):
+        # Rows below `count` times `query` (a vector, or a matrix of them as
+        # columns), base rows first.
+        base = self._base_count
+        if count <= base:
+            return self._base[:count] @ query
+        scores = self._vectors[:count - base] @ query
+        if base:
+            scores = np.concatenate([self._base @ query, scores])
+        return scores
+
+    def _take(self, rows):
+        base = self._base_count
+        if not base:
+            return self._vectors[rows]
+        in_base = rows < base
+        if in_base.all():
+            return self._base[rows]
+        taken = np.empty((len(rows), self.dim), dtype=np.float32)
+        taken[in_base] = self._base[rows[in_base]]
+        taken[~in_base] = self._vectors[rows[~in_base] - base]
+        return taken
+
+    def _on_add(self, start, vectors):
+        pass
+
+    def search(self, vec, k=1):
+        raise NotImplementedError
+
+    def _top_k(self, rows, scores, k):
+        if len(scores) == 0:
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        ids = self._ids
+        return [(ids[rows[i]] if rows is not None else ids[i], float(scores[i])) for i in top]
+
+    def _state(self):
+        return {}
+
+    def _restore(self, state):
+        pass
+
+    def save(self, path):
+        with self._lock:
+            count, base = self._count, self._base_count
+            arrays = {
+                "ids": np.array(self._ids[:count], dtype=str),
+                "vectors": (self._vectors[:count - base] if count > base
+                            else np.zeros((0, self.dim or 0), dtype=np.float32)),
+            }
+            arrays["meta"] = np.array(json.dumps(self.meta, ensure_ascii=False))
+            params = {"kind": self.kind, "dim": self.dim, "base": base}
+            state = self._state()
+            params.update(state.pop("params", {}))
+            arrays.update(state)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, params=np.array(json.dumps(params)), **arrays)
+        os.replace(tmp, path)
+
+
+class ExactIndex(VectorIndex):
+    kind = "exact"
+
+    def search(self, vec, k=1):
+        count = self._count
+        if not count:
+            return []
+        scores = self._scores(count, np.asarray(vec, dtype=np.float32))
+        return self._top_k(None, scores, k)
+
+
+class IVFIndex(VectorIndex):
+    kind = "ivf"
+
+    def __init__(self, dim=None, nlist=None, nprobe=8, train_threshold=1024, retrain_factor=4, iterations=10):
+        super().__init__(dim)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.retrain_factor = retrain_factor
+        self.iterations = iterations
+        # (centroids, lists) swapped as one tuple so search() never pairs new
+        # centroids with old lists.
+        self._clusters = (None, [])
+        self._trained_at = 0
+
+    def _on_add(self, start, vectors):
+        centroids, lists = self._clusters
+        if centroids is None:
+            if self._count >= self.train_threshold:
+                self._train()
+        elif self._count >= self.retrain_factor * self._trained_at:
+            self._train()
+        else:
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for offset, bucket in enumerate(assignments):
+                lists[bucket].append(start + offset)
+
+    def _train(self):
+        # Spherical k-means on a sample, then bucket every stored vector.
+        count = self._count
+        nlist = self.nlist or max(1, int(np.sqrt(count)))
+        nlist = min(nlist, count)
+        rng = np.random.default_rng(0)
+        sample_size = min(count, 64 * nlist)
+        sample = self._take(rng.choice(count, sample_size, replace=False))
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignments == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    if norm > 0:
+                        centroids[c] = centroid / norm
+        assignments = np.argmax(self._scores(count, centroids.T), axis=1)
+        self._assign(centroids, assignments)
+        self._trained_at = count
+
+    def _assign(self, centroids, assignments):
+        lists = [[] for _ in range(len(centroids))]
+        for row, bucket in enumerate(assignments):
+            lists[bucket].append(row)
+        self._clusters = (centroids, lists)
+
+    def search(self, vec, k=1):
+        count = self._count
+        if not count:
+            return []
+        vec = np.asarray(vec, dtype=np.float32)
+        centroids, lists = self._clusters
+        if centroids is None:
+            scores = self._scores(count, vec)
+            return self._top_k(None, scores, k)
+        nprobe = min(self.nprobe, len(centroids))
+        probe = np.argpartition(-(centroids @ vec), nprobe - 1)[:nprobe]
+        rows = np.fromiter((row for bucket in probe for row in lists[bucket] if row < count), dtype=np.intp)
+        scores = self._take(rows) @ vec
+        return self._top_k(rows, scores, k)
+
+    def _state(self):
+        centroids, lists = self._clusters
+        assignments = np.full(self._count, -1, dtype=np.int32)
+        for bucket, rows in enumerate(lists):
+            assignments[rows] = bucket
+        state = {
+            "params": {
+                "nlist": self.nlist,
+                "nprobe": self.nprobe,
+                "train_threshold": self.train_threshold,
+                "retrain_factor": self.retrain_factor,
+                "iterations": self.iterations,
+                "trained_at": self._trained_at,
+            },
+            "assignments": assignments,
+        }
+        if centroids is not None:
+            state["centroids"] = centroids
+        return state
+
+    def _restore(self, state):
+        if "centroids" in state:
+            self._assign(state["centroids"], state["assignments"])
+
+
+INDEX_TYPES = {
+    ExactIndex.kind: ExactIndex,
+    IVFIndex.kind: IVFIndex,
+}
+
+
+def create_index(kind="exact", **options):
+    try:
+        index_type = INDEX_TYPES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown vector index type '{kind}'") from None
+    return index_type(**options)
+
+
+def load_index(path, base_ids=(), base=None, **overrides):
+    # `base_ids` / `base` are what was passed to set_base() before save();
+    # ValueError when they are not the rows the index was saved over.
+    with np.load(path) as data:
+        params = json.loads(str(data["params"]))
+        arrays = {name: data[name] for name in data.files if name != "params"}
+    kind = params.pop("kind")
+    trained_at = params.pop("trained_at", 0)
+    base_count = params.pop("base", 0)
+    params.update(overrides)
+    index = create_index(kind, **params)
+    meta = json.loads(str(arrays.pop("meta"))) if "meta" in arrays else {}
+    ids, vectors = arrays.pop("ids").tolist(), arrays.pop("vectors")
+    base_ids = list(base_ids)
+    if ids[:base_count] != base_ids or base_count != len(base_ids):
+        raise ValueError(f"{path} was saved over other base rows ({base_count})")
+    if base_count:
+        base = np.atleast_2d(base)
+        if len(base) != base_count:
+            raise ValueError(f"{path} needs {base_count} base vectors, got {len(base)}")
+        index._attach(base_ids, base if base.dtype == np.float32 else base.astype(np.float32))
+    if len(ids) > base_count:
+        count = index._append(vectors)
+        index._ids = ids
+        index._rows = {item_id: row for row, item_id in enumerate(ids)}
+        index._count = count
+    index._restore(arrays)
+    index.meta = meta
+    if trained_at:
+        index._trained_at = trained_at
+    return index
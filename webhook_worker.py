@@ -0,0 +1,129 @@
+import os
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+# Background processing for LINE webhooks. The Flask handler verifies the
+# signature, hands the payload to submit() and answers 200 straight away;
+# a pool of workers drains the bounded queue. When the queue is full,
+# submit() returns False so the caller can push back (LINE redelivers).
+#
+# kind="thread"  handlers run on the worker threads (default).
+# kind="process" worker threads forward each payload to a process pool; the
+#                handler must then be a picklable module-level function.
+#                The pool forks after warm-up, so the children inherit the
+#                loaded models; modules holding connections (db,
+#                ollama_client, line_client, embedding_service,
+#                youtube_search, write_behind) reset them in the child with
+#                os.register_at_fork instead of sharing the parent's sockets.
+
+WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "4"))
+QUEUE_SIZE = int(os.environ.get("WEBHOOK_QUEUE_SIZE", "100"))
+WORKER_KIND = os.environ.get("WEBHOOK_WORKER_KIND", "thread")
+
+_STOP = object()
+
+
+class EventWorker:
+    def __init__(self, handle, workers=WORKERS, queue_size=QUEUE_SIZE, kind=WORKER_KIND):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker kind '{kind}'")
+        self.handle = handle
+        self.workers = workers
+        self.kind = kind
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return self
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def submit(self, payload):
+        try:
+            self._queue.put_nowait((time.monotonic(), payload))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+            enqueued_at, payload = item
+            with self._lock:
+                self.in_flight += 1
+                self.total_wait += time.monotonic() - enqueued_at
+            try:
+                if self._executor is not None:
+                    self._executor.submit(self.handle, payload).result()
+                else:
+                    self.handle(payload)
+                ok = True
+            except Exception:
+                traceback.print_exc()
+                ok = False
+            with self._lock:
+                self.in_flight -= 1
+                if ok:
+                    self.processed += 1
+                else:
+                    self.failed += 1
+            self._queue.task_done()
+
+    def join(self):
+        # Block until every queued payload has been handled.
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            started = self.processed + self.failed + self.in_flight
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "max_queue_depth": self.max_queue_depth,
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "failed": self.failed,
+                "avg_queue_wait": self.total_wait / started if started else 0.0,
+            }
@@ -0,0 +1,249 @@
+import atexit
+import json
+import os
+import threading
+import time
+import traceback
+import weakref
+
+import db
+
+# Write-behind journal for log-style Neo4j writes (chat logs, conversation
+# turns, saved answers, user registration, new Barista nodes). submit() only appends to an
+# in-process buffer; a background thread flushes the buffer as one UNWIND
+# query per kind whenever `batch_size` rows are waiting or `flush_interval`
+# seconds have passed. Rows that cannot be written (Neo4j down, buffer full)
+# go to an append-only spill file and are replayed on a later flush, so
+# delivery is at-least-once and the reply path never waits on the database.
+
+BATCH_SIZE = int(os.environ.get("WRITE_BEHIND_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.environ.get("WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))
+MAX_PENDING = int(os.environ.get("WRITE_BEHIND_MAX_PENDING", "10000"))
+SPILL_PATH = os.environ.get("WRITE_BEHIND_SPILL_PATH", "write_behind.spill.jsonl")
+
+# Flushed in this order, so users exist before rows that MATCH them.
+WRITE_QUERIES = {
+    "user": '''
+    UNWIND $rows AS row
+    MERGE (u:User {uid: row.uid})
+    ''',
+    "turn": '''
+    UNWIND $rows AS row
+    MERGE (u:User {uid: row.uid})
+    CREATE (t:Turn {role: row.role, text: row.text, timestamp: row.timestamp})
+    CREATE (u)-[:SAID]->(t)
+    ''',
+    "chat": '''
+    UNWIND $rows AS row
+    MATCH (u:User {uid: row.uid})
+    CREATE (c:Chat {message: row.message, reply: row.reply, timestamp: row.timestamp})
+    CREATE (u)-[:SENT]->(c)
+    ''',
+    "response": '''
+    UNWIND $rows AS row
+    MATCH (u:User {uid: row.uid})
+    CREATE (a:Answer {text: row.answer_text})
+    CREATE (r:Response {text: row.response_msg})
+    CREATE (u)-[:useranswer]->(a)
+    CREATE (a)-[:response]->(r)
+    ''',
+    "barista": '''
+    UNWIND $rows AS row
+    CREATE (:Barista {question: row.question, msg_reply: row.reply})
+    ''',
+}
+
+
+# Journals alive in this process, reset in forked children (see _reset).
+_journals = weakref.WeakSet()
+
+
+class WriteBehindJournal:
+    def __init__(self, queries=WRITE_QUERIES, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_pending=MAX_PENDING, spill_path=SPILL_PATH):
+        self.queries = dict(queries)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self._reset()
+        _journals.add(self)
+        self.written = 0
+        self.spilled = 0
+        self.flushes = 0
+        self.failures = 0
+        self.corrupt = 0
+
+    def _reset(self):
+        # Also run in a forked child: the parent's buffered rows stay the
+        # parent's to write, and the flush thread has to be started again.
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopped.set()
+            self._wakeup.set()
+            thread.join()
+        self.flush()
+
+    def submit(self, kind, row):
+        if kind not in self.queries:
+            raise ValueError(f"Unknown write kind '{kind}'")
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            if len(self._pending) < self.max_pending:
+                self._pending.append((kind, row))
+                if len(self._pending) >= self.batch_size:
+                    self._wakeup.set()
+                return
+        # Buffer is full: keep the row on disk rather than block the caller.
+        self._spill([(kind, row)])
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                traceback.print_exc()
+
+    def flush(self):
+        with self._flush_lock:
+            # Read the spill file before taking the buffer, so a bad file
+            # cannot cost the rows still in memory.
+            replayed, replay_path = self._replay()
+            with self._lock:
+                taken, self._pending = self._pending, []
+            try:
+                return self._write(replayed + taken, replay_path)
+            except BaseException:
+                # Nothing was spilled for these rows: hand them back.
+                with self._lock:
+                    self._pending[:0] = taken
+                raise
+
+    def _write(self, entries, replay_path):
+        # Caller holds _flush_lock.
+        if not entries:
+            if replay_path is not None:
+                os.remove(replay_path)
+            return 0
+        self.flushes += 1
+        by_kind = {}
+        for kind, row in entries:
+            by_kind.setdefault(kind, []).append(row)
+        failed = []
+        for kind in self.queries:
+            rows = by_kind.get(kind)
+            for start in range(0, len(rows or []), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                try:
+                    db.write_query(self.queries[kind], {'rows': chunk})
+                    self.written += len(chunk)
+                except Exception as e:
+                    print("Write-behind flush failed:", e)
+                    self.failures += 1
+                    failed.extend((kind, row) for row in chunk)
+        if failed:
+            self._spill(failed)
+        # Only now is every replayed row either written or spilled again.
+        if replay_path is not None:
+            os.remove(replay_path)
+        return len(entries) - len(failed)
+
+    def _spill(self, entries):
+        data = "".join(json.dumps({"kind": kind, "row": row}, ensure_ascii=False) + "\n"
+                       for kind, row in entries).encode("utf-8")
+        with self._lock:
+            with open(self.spill_path, "a+b") as f:
+                # Start on a fresh line if a crash left the last one torn.
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data
+                f.write(data)
+            self.spilled += len(entries)
+
+    def _replay(self):
+        # Caller holds _flush_lock. The spill file is moved aside before it is
+        # read, so rows spilled meanwhile land in a fresh file; flush()
+        # deletes the moved file once its rows are written or re-spilled.
+        replaying = self.spill_path + ".replay"
+        with self._lock:
+            if not os.path.exists(replaying):
+                if not os.path.exists(self.spill_path):
+                    return [], None
+                os.replace(self.spill_path, replaying)
+        entries = []
+        corrupt = []
+        with open(replaying, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    entry = (record["kind"], record["row"])
+                except (ValueError, KeyError, TypeError):
+                    # e.g. a line torn by a crash mid-spill
+                    corrupt.append(line)
+                    continue
+                if entry[0] in self.queries:
+                    entries.append(entry)
+                else:
+                    corrupt.append(line)
+        if corrupt:
+            # Kept aside for inspection instead of failing every flush.
+            print(f"Write-behind: {len(corrupt)} unreadable spill line(s) moved to {self.spill_path}.corrupt")
+            with open(self.spill_path + ".corrupt", "a", encoding="utf-8") as f:
+                f.writelines(line + "\n" for line in corrupt)
+            self.corrupt += len(corrupt)
+        return entries, replaying
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "written": self.written,
+            "spilled": self.spilled,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "corrupt": self.corrupt,
+        }
+
+
+def _reset_after_fork():
+    for journal in list(_journals):
+        journal._reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def timestamp():
+    # Neo4j's timestamp(): milliseconds since the epoch, taken at submit time.
+    return int(time.time() * 1000)
+
+
+# Process-wide journal shared by every caller.
+journal = WriteBehindJournal()
+atexit.register(journal.stop)
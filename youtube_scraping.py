@@ -2,40 +2,25 @@ import os
 import re
 from flask import Flask, request, jsonify
 from bs4 import BeautifulSoup
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-import chromedriver_autoinstaller
+
+from browser_pool import browser_pool
+import youtube_search
+from search_cache import SearchCache
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Setup Chrome options
-chrome_options = webdriver.ChromeOptions()
-chrome_options.add_argument('--headless')  # Run Chrome in headless mode
-chrome_options.add_argument('--no-sandbox')
-chrome_options.add_argument('--disable-dev-shm-usage')
-
-# Install ChromeDriver automatically
-chromedriver_autoinstaller.install()
-
 # Define Flask routes
 @app.route('/')
 def index():
     return "<h1>YouTube Search API</h1>"
 
-@app.route('/api', methods=['GET'])
-def api():
-    message = request.args.get('msg')
-    if not message:
-        return jsonify({"error": "No message provided"}), 400
-
-    search_query = f"{message} site:youtube.com"
+def scrape_with_browser(search_query):
     url = "https://www.youtube.com/results"
 
-    # Set up the WebDriver
-    driver = webdriver.Chrome(options=chrome_options)
-    
-    try:
+    # Borrow a warm driver from the shared pool
+    with browser_pool.driver() as driver:
         driver.get(url)
         search_box = driver.find_element(By.NAME, "search_query")
         search_box.send_keys(search_query)
@@ -43,28 +28,48 @@ def api():
 
         driver.implicitly_wait(10)  # Wait for the page to load
 
-        # Parse the page with BeautifulSoup
         html = driver.page_source
-        soup = BeautifulSoup(html, "html.parser")
-
-        # Extract search results
-        results = []
-        title_elements = soup.find_all('h3', class_='title-and-badge')  # Adjust class based on YouTube's structure
-        for title_element in title_elements:
-            title = title_element.get_text()
-            link = title_element.find('a')['href'] if title_element.find('a') else "N/A"
-            results.append({
-                'title': title,
-                'link': f"https://www.youtube.com{link}" if link else "N/A",
-            })
-        
+
+    # Parse the page with BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Extract search results
+    results = []
+    title_elements = soup.find_all('h3', class_='title-and-badge')  # Adjust class based on YouTube's structure
+    for title_element in title_elements:
+        title = title_element.get_text()
+        link = title_element.find('a')['href'] if title_element.find('a') else "N/A"
+        results.append({
+            'title': title,
+            'link': f"https://www.youtube.com{link}" if link else "N/A",
+        })
+    return results
+
+# Full result lists per normalized query, shared by concurrent requests
+search_cache = SearchCache(namespace="api")
+
+def search_youtube(search_query):
+    # Plain HTTP + ytInitialData first; the browser only when that fails
+    return youtube_search.search(search_query, fallback=scrape_with_browser)
+
+@app.route('/api', methods=['GET'])
+def api():
+    message = request.args.get('msg')
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+
+    search_query = f"{message} site:youtube.com"
+
+    try:
+        results = search_cache.get_or_fetch(search_query, search_youtube)
         return jsonify(results)
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    
-    finally:
-        driver.quit()  # Ensure driver is closed properly
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    return jsonify(search_cache.stats())
 
 # Run the Flask app
 if __name__ == '__main__':
@@ -0,0 +1,117 @@
+import json
+import os
+import re
+
+import requests
+
+import metrics
+
+# Browserless YouTube search. The results page ships its data as a
+# `ytInitialData` JSON blob, so one HTTP GET plus a JSON parse gives the same
+# {'title', 'link'} records the Selenium scrapers build from the rendered DOM,
+# in milliseconds instead of seconds. search() falls back to a Selenium
+# scraper only when the fetch or the parse fails.
+#
+# YOUTUBE_BACKEND=selenium skips the HTTP path entirely.
+
+RESULTS_URL = "https://www.youtube.com/results"
+BACKEND = os.environ.get("YOUTUBE_BACKEND", "http")
+TIMEOUT = float(os.environ.get("YOUTUBE_TIMEOUT", "10"))
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Accept-Language": "th-TH,th;q=0.9,en;q=0.8",
+}
+
+_INITIAL_DATA = re.compile(r'(?:var ytInitialData|window\["ytInitialData"\])\s*=\s*')
+
+session = requests.Session()
+
+
+def _reset_after_fork():
+    # A forked webhook worker opens its own connections.
+    global session
+    session = requests.Session()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def fetch_results_html(query):
+    response = session.get(RESULTS_URL, params={"search_query": query}, headers=HEADERS, timeout=TIMEOUT)
+    response.raise_for_status()
+    return response.text
+
+
+def extract_initial_data(html):
+    match = _INITIAL_DATA.search(html)
+    if match is None:
+        raise ValueError("ytInitialData not found in page")
+    data, _ = json.JSONDecoder().raw_decode(html, match.end())
+    return data
+
+
+def _text(field):
+    if not field:
+        return ""
+    if "simpleText" in field:
+        return field["simpleText"]
+    return "".join(run.get("text", "") for run in field.get("runs", []))
+
+
+def _video_renderers(data):
+    # Depth-first, in document order, so results keep YouTube's ranking.
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            renderer = node.get("videoRenderer")
+            if isinstance(renderer, dict) and "videoId" in renderer:
+                yield renderer
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def parse_initial_data(html, limit=None):
+    results = []
+    for renderer in _video_renderers(extract_initial_data(html)):
+        results.append({
+            'title': _text(renderer.get("title")).strip(),
+            'link': f"https://www.youtube.com/watch?v={renderer['videoId']}",
+        })
+        if limit is not None and len(results) >= limit:
+            break
+    return results
+
+
+def parse_rendered_html(html, limit=None):
+    # The Selenium path: parse the DOM the browser rendered.
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    results = []
+    for title_element in soup.find_all('a', id='video-title', limit=limit):
+        results.append({
+            'title': title_element.get_text().strip(),
+            'link': f"https://www.youtube.com{title_element['href']}",
+        })
+    return results
+
+
+def search(query, limit=None, fallback=None):
+    # fallback(query) is the Selenium scraper to use when the HTTP path fails.
+    if BACKEND != "selenium":
+        try:
+            with metrics.span("youtube.http"):
+                results = parse_initial_data(fetch_results_html(query), limit)
+            if results:
+                return results
+        except (requests.RequestException, ValueError) as e:
+            print("YouTube HTTP search failed, falling back:", e)
+    if fallback is None:
+        return []
+    with metrics.span("youtube.browser"):
+        return fallback(query)